@@ -26,7 +26,9 @@ model = dict(
         batch_size=24))
 
 # data settings
-train_dataloader = dict(batch_size=16)
+train_dataloader = dict(batch_size=16, pin_memory=True, prefetch_factor=4)
+val_dataloader = dict(num_workers=4, pin_memory=True, prefetch_factor=4)
+test_dataloader = dict(num_workers=4, pin_memory=True, prefetch_factor=4)
 
 # runtime settings
 default_hooks = dict(checkpoint=dict(type='CheckpointHook', interval=5))
@@ -36,3 +36,5 @@ model = dict(
             custom_values=[0, 0],
             rotations=[0, 1.57],
             reshape_out=True)))
+
+env_cfg = dict(cudnn_benchmark=True)
@@ -0,0 +1,35 @@
+_base_ = './second_hv_secfpn_sbn-all_16xb2-2x_waymoD5-3d-3class.py'
+
+point_cloud_range = [-76.8, -51.2, -2, 76.8, 51.2, 4]
+backend_args = None
+
+# flip, rotation, scaling, range filtering and shuffling are performed on
+# the batch by the data preprocessor instead of the dataloader workers
+model = dict(
+    data_preprocessor=dict(points_batch_augments=[
+        dict(
+            type='BatchGlobalRotScaleFlip3D',
+            flip_ratio_bev_horizontal=0.5,
+            flip_ratio_bev_vertical=0.5,
+            rot_range=[-0.78539816, 0.78539816],
+            scale_ratio_range=[0.95, 1.05],
+            point_cloud_range=point_cloud_range,
+            shuffle_points=True)
+    ]))
+
+train_pipeline = [
+    dict(
+        type='LoadPointsFromFile',
+        coord_type='LIDAR',
+        load_dim=6,
+        use_dim=5,
+        backend_args=backend_args),
+    dict(type='LoadAnnotations3D', with_bbox_3d=True, with_label_3d=True),
+    # filter the boxes per sample as well, so that `filter_empty_gt` still
+    # drops the frames without any box in range
+    dict(type='ObjectRangeFilter', point_cloud_range=point_cloud_range),
+    dict(
+        type='Pack3DDetInputs',
+        keys=['points', 'gt_bboxes_3d', 'gt_labels_3d'])
+]
+train_dataloader = dict(dataset=dict(dataset=dict(pipeline=train_pipeline)))
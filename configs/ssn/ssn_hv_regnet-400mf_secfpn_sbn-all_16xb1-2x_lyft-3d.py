@@ -19,3 +19,5 @@ model = dict(
     pts_neck=dict(in_channels=[64, 160, 384]))
 # dataset settings
 train_dataloader = dict(batch_size=1, num_workers=2)
+
+env_cfg = dict(cudnn_benchmark=True)
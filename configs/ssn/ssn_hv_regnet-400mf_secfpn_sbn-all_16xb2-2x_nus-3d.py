@@ -18,3 +18,5 @@ model = dict(
         norm_eval=False,
         style='pytorch'),
     pts_neck=dict(in_channels=[64, 160, 384]))
+
+env_cfg = dict(cudnn_benchmark=True)
@@ -71,9 +71,21 @@ test_pipeline = [
     dict(type='Pack3DDetInputs', keys=['points'])
 ]
 train_dataloader = dict(
-    batch_size=2, num_workers=4, dataset=dict(pipeline=train_pipeline))
-test_dataloader = dict(dataset=dict(pipeline=test_pipeline))
-val_dataloader = dict(dataset=dict(pipeline=test_pipeline))
+    batch_size=2,
+    num_workers=4,
+    pin_memory=True,
+    prefetch_factor=4,
+    dataset=dict(pipeline=train_pipeline))
+test_dataloader = dict(
+    num_workers=4,
+    pin_memory=True,
+    prefetch_factor=4,
+    dataset=dict(pipeline=test_pipeline))
+val_dataloader = dict(
+    num_workers=4,
+    pin_memory=True,
+    prefetch_factor=4,
+    dataset=dict(pipeline=test_pipeline))
 
 # model settings
 model = dict(
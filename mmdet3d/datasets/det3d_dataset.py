@@ -123,6 +123,13 @@ class Det3DDataset(BaseDataset):
 
             self.num_ins_per_cat = [0] * len(self.METAINFO['classes'])
 
+        # lookup table of `label_mapping` to map the labels of all instances
+        # at once, the label -1 is mapped separately
+        num_ori_classes = len(self.METAINFO['classes'])
+        self._label_mapping_arr = np.array(
+            [self.label_mapping[i] for i in range(num_ori_classes)],
+            dtype=np.int64)
+
         super().__init__(
             ann_file=ann_file,
             metainfo=metainfo,
@@ -236,9 +243,13 @@ class Det3DDataset(BaseDataset):
                 temp_anns = [item[ann_name] for item in instances]
                 # map the original dataset label to training label
                 if 'label' in ann_name and ann_name != 'attr_label':
-                    temp_anns = [
-                        self.label_mapping[item] for item in temp_anns
-                    ]
+                    labels = np.array(temp_anns, dtype=np.int64)
+                    assert np.all((labels >= -1) & (
+                        labels < len(self._label_mapping_arr))), \
+                        f'Labels of {ann_name} out of the range of the ' \
+                        f'original classes: {labels}'
+                    temp_anns = np.where(labels == -1, -1,
+                                         self._label_mapping_arr[labels])
                 if ann_name in name_mapping:
                     mapped_ann_name = name_mapping[ann_name]
                 else:
@@ -1,5 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import copy
+import os.path as osp
 from typing import List, Optional, Union
 
 import mmcv
@@ -583,6 +584,10 @@ class LoadPointsFromFile(BaseTransform):
             usually used in Waymo dataset.Defaults to False.
         backend_args (dict, optional): Arguments to instantiate the
             corresponding backend. Defaults to None.
+        use_mmap (bool): Whether to memory-map local point cloud files
+            instead of reading them into memory, which avoids an extra copy
+            and lets the OS page cache serve repeated reads. Only used when
+            ``backend_args`` is None. Defaults to False.
     """
 
     def __init__(self,
@@ -593,7 +598,8 @@ class LoadPointsFromFile(BaseTransform):
                  use_color: bool = False,
                  norm_intensity: bool = False,
                  norm_elongation: bool = False,
-                 backend_args: Optional[dict] = None) -> None:
+                 backend_args: Optional[dict] = None,
+                 use_mmap: bool = False) -> None:
         self.shift_height = shift_height
         self.use_color = use_color
         if isinstance(use_dim, int):
@@ -608,6 +614,7 @@ class LoadPointsFromFile(BaseTransform):
         self.norm_intensity = norm_intensity
         self.norm_elongation = norm_elongation
         self.backend_args = backend_args
+        self.use_mmap = use_mmap
 
     def _load_points(self, pts_filename: str) -> np.ndarray:
         """Private function to load point clouds data.
@@ -618,6 +625,13 @@ class LoadPointsFromFile(BaseTransform):
         Returns:
             np.ndarray: An array containing point clouds data.
         """
+        if self.use_mmap and self.backend_args is None \
+                and osp.isfile(pts_filename):
+            # the used dimensions are copied out of the mapped file in
+            # `transform`, so the mapping is released right after loading
+            if pts_filename.endswith('.npy'):
+                return np.load(pts_filename, mmap_mode='r')
+            return np.memmap(pts_filename, dtype=np.float32, mode='r')
         try:
             pts_bytes = get(pts_filename, backend_args=self.backend_args)
             points = np.frombuffer(pts_bytes, dtype=np.float32)
@@ -692,6 +706,7 @@ class LoadPointsFromFile(BaseTransform):
         repr_str += f'use_dim={self.use_dim})'
         repr_str += f'norm_intensity={self.norm_intensity})'
         repr_str += f'norm_elongation={self.norm_elongation})'
+        repr_str += f'use_mmap={self.use_mmap})'
         return repr_str
 
 
@@ -1,6 +1,14 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import hashlib
+import logging
+import math
+import mmap
+import os
 import os.path as osp
-from typing import Callable, List, Union
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Callable, List, Optional, Tuple, Union
 
 import numpy as np
 from mmengine import print_log
@@ -11,6 +19,55 @@ from mmdet3d.structures import CameraInstance3DBoxes, LiDARInstance3DBoxes
 from .det3d_dataset import Det3DDataset
 from .kitti_dataset import KittiDataset
 
+# version of the layout of the parsed data list cache, which should be
+# increased whenever the layout changes to invalidate the old caches
+_DATA_LIST_CACHE_VERSION = 2
+# dataset and raw data infos used by the worker processes of the parallel
+# data list parsing
+_parse_worker_dataset = None
+_parse_worker_raw_data_list = None
+
+
+def _init_parse_worker(dataset: 'WaymoDataset',
+                       raw_data_list: List[dict]) -> None:
+    global _parse_worker_dataset, _parse_worker_raw_data_list
+    _parse_worker_dataset = dataset
+    _parse_worker_raw_data_list = raw_data_list
+
+
+def _parse_data_list(dataset: 'WaymoDataset',
+                     raw_data_list: List[dict]) -> List[dict]:
+    """Parse the raw data infos of the dataset.
+
+    For `mv_image_based`, `parse_data_info` returns a list of image-wise
+    infos of a frame, which are flattened into the data list. The other
+    load types return a single info per frame, so the return type is known
+    from the load type and is not checked per info.
+    """
+    data_infos = map(dataset.parse_data_info, raw_data_list)
+    if dataset.load_type == 'mv_image_based':
+        return list(chain.from_iterable(data_infos))
+    return list(data_infos)
+
+
+def _parse_data_list_worker(chunk: Tuple[int, int]) -> tuple:
+    """Parse a chunk of raw data infos in a worker process.
+
+    Args:
+        chunk (tuple[int]): Start and stop indices of the chunk in the raw
+            data infos of the worker.
+
+    Returns:
+        tuple: The parsed data list and the number of instances per category
+        in the chunk.
+    """
+    dataset = _parse_worker_dataset
+    dataset.num_ins_per_cat = [0] * len(dataset.num_ins_per_cat)
+    start, stop = chunk
+    data_list = _parse_data_list(dataset,
+                                 _parse_worker_raw_data_list[start:stop])
+    return data_list, dataset.num_ins_per_cat
+
 
 @DATASETS.register_module()
 class WaymoDataset(KittiDataset):
@@ -69,6 +126,14 @@ class WaymoDataset(KittiDataset):
             supported from waymo version 1.3.1. Defaults to False.
         load_interval (int): load frame interval. Defaults to 1.
         max_sweeps (int): max sweep for each frame. Defaults to 0.
+        cache_data_list (bool): Whether to cache the parsed data list next
+            to ``ann_file`` and reuse it in later runs, which skips parsing
+            the annotations in every process. The cache is keyed by the
+            modification time of ``ann_file`` and the loading options.
+            Defaults to False.
+        use_cams (List[str], optional): Cameras whose images are loaded in
+            `mv_image_based` mode. All cameras are loaded if not given.
+            Defaults to None.
     """
     METAINFO = {
         'classes': ('Car', 'Pedestrian', 'Cyclist'),
@@ -100,8 +165,19 @@ class WaymoDataset(KittiDataset):
                  cam_sync_instances: bool = False,
                  load_interval: int = 1,
                  max_sweeps: int = 0,
+                 cache_data_list: bool = False,
+                 use_cams: Optional[List[str]] = None,
                  **kwargs) -> None:
         self.load_interval = load_interval
+        self.cache_data_list = cache_data_list
+        self._use_cams_set = set(use_cams) if use_cams else None
+        # camera matrices of all images stacked by `_stack_cam_matrices`
+        self.cam_matrices = dict()
+        # whether `parse_ann_info` keeps the 3D boxes as raw arrays, only set
+        # while the data list is being loaded
+        self._lazy_boxes = False
+        # prefixes of the image paths of each camera, see `load_data_list`
+        self._img_prefix_tab = dict()
         # set loading mode for different task settings
         self.cam_sync_instances = cam_sync_instances
         # construct self.cat_ids for vision-only anns parsing
@@ -167,6 +243,10 @@ class WaymoDataset(KittiDataset):
 
         if self.load_type == 'frame_based':
             gt_bboxes_3d = LiDARInstance3DBoxes(ann_info['gt_bboxes_3d'])
+        elif self._lazy_boxes:
+            # keep the raw array while loading the data list, the boxes are
+            # built in `get_data_info` only for the fetched samples
+            gt_bboxes_3d = ann_info['gt_bboxes_3d']
         else:
             gt_bboxes_3d = CameraInstance3DBoxes(ann_info['gt_bboxes_3d'])
 
@@ -183,9 +263,22 @@ class WaymoDataset(KittiDataset):
     def load_data_list(self) -> List[dict]:
         """Add the load interval.
 
+        For `mv_image_based`, the raw data infos can be parsed by multiple
+        processes by setting the environment variable
+        ``MMDET3D_PARALLEL_PARSE`` to the number of processes, which is
+        disabled by default.
+
         Returns:
             list[dict]: A list of annotation.
         """  # noqa: E501
+        cache_file = None
+        if self.cache_data_list:
+            cache_file = self._get_data_list_cache_file()
+            if cache_file is not None and osp.isfile(cache_file):
+                data_list = self._load_data_list_cache(cache_file)
+                if data_list is not None:
+                    return data_list
+
         # `self.ann_file` denotes the absolute annotation file path if
         # `self.root=None` or relative path if `self.root=/path/to/data/`.
         annotations = load(self.ann_file)
@@ -196,45 +289,282 @@ class WaymoDataset(KittiDataset):
             raise ValueError('Annotation must have data_list and metainfo '
                              'keys')
         metainfo = annotations['metainfo']
-        raw_data_list = annotations['data_list']
-        raw_data_list = raw_data_list[::self.load_interval]
+        raw_data_list = annotations.pop('data_list')
+        # release the annotations so that the skipped infos are freed right
+        # after subsampling instead of being kept alive during parsing
+        del annotations
         if self.load_interval > 1:
+            raw_data_list = raw_data_list[::self.load_interval]
             print_log(
                 f'Sample size will be reduced to 1/{self.load_interval} of'
                 ' the original data sample',
                 logger='current')
 
+        mv_image_based = self.load_type == 'mv_image_based'
+        self.cam_matrices = dict()
+        if mv_image_based:
+            use_cams_set = self._use_cams_set
+            if use_cams_set is not None:
+                # drop the unused cameras before any per-image work
+                for info in raw_data_list:
+                    info['images'] = {
+                        cam_key: img_info
+                        for cam_key, img_info in info['images'].items()
+                        if cam_key in use_cams_set
+                    }
+            self.cam_matrices = self._stack_cam_matrices(raw_data_list)
+            # `data_prefix` has been joined with `data_root` at this point,
+            # so the image paths can be built by string concatenation
+            self._img_prefix_tab = {
+                cam_key:
+                prefix if not prefix or prefix.endswith('/') else prefix + '/'
+                for cam_key, prefix in self.data_prefix.items()
+            }
+
         # Meta information load from annotation file will not influence the
         # existed meta information load from `BaseDataset.METAINFO` and
         # `metainfo` arguments defined in constructor.
         for k, v in metainfo.items():
             self._metainfo.setdefault(k, v)
 
-        # load and parse data_infos.
-        data_list = []
-        for raw_data_info in raw_data_list:
-            # parse raw data information to target format
-            data_info = self.parse_data_info(raw_data_info)
-            if isinstance(data_info, dict):
-                # For image tasks, `data_info` should information if single
-                # image, such as dict(img_path='xxx', width=360, ...)
-                data_list.append(data_info)
-            elif isinstance(data_info, list):
-                # For video tasks, `data_info` could contain image
-                # information of multiple frames, such as
-                # [dict(video_path='xxx', timestamps=...),
-                #  dict(video_path='xxx', timestamps=...)]
-                for item in data_info:
-                    if not isinstance(item, dict):
-                        raise TypeError('data_info must be list of dict, but '
-                                        f'got {type(item)}')
-                data_list.extend(data_info)
+        # load and parse data_infos
+        num_workers = 0
+        if mv_image_based:
+            self._lazy_boxes = True
+            # the boxes are kept as arrays, so that the parsed infos are
+            # cheap to send back from the worker processes
+            num_workers = int(os.environ.get('MMDET3D_PARALLEL_PARSE', 0))
+        try:
+            if num_workers > 1 and len(raw_data_list) > num_workers:
+                data_list = self._parallel_parse_data_list(
+                    raw_data_list, num_workers)
             else:
-                raise TypeError('data_info should be a dict or list of dict, '
-                                f'but got {type(data_info)}')
+                data_list = _parse_data_list(self, raw_data_list)
+        finally:
+            self._lazy_boxes = False
+
+        if cache_file is not None:
+            self._dump_data_list_cache(cache_file, metainfo, data_list)
 
         return data_list
 
+    def _parallel_parse_data_list(self, raw_data_list: List[dict],
+                                  num_workers: int) -> List[dict]:
+        """Parse the raw data infos in chunks by a process pool.
+
+        Args:
+            raw_data_list (list[dict]): Raw data infos.
+            num_workers (int): Number of worker processes.
+
+        Returns:
+            list[dict]: A list of annotation in the order of
+            ``raw_data_list``.
+        """
+        # a few chunks per worker to balance the load. The raw data infos are
+        # passed to the workers once when they start, which is free under
+        # fork, and only the index ranges of the chunks are sent per task
+        chunk_size = math.ceil(len(raw_data_list) / (num_workers * 4))
+        chunks = [(i, min(i + chunk_size, len(raw_data_list)))
+                  for i in range(0, len(raw_data_list), chunk_size)]
+        data_list = []
+        with ProcessPoolExecutor(
+                max_workers=num_workers,
+                initializer=_init_parse_worker,
+                initargs=(self, raw_data_list)) as executor:
+            for chunk_data_list, num_ins_per_cat in executor.map(
+                    _parse_data_list_worker, chunks):
+                data_list.extend(chunk_data_list)
+                for label, num in enumerate(num_ins_per_cat):
+                    self.num_ins_per_cat[label] += num
+        print_log(
+            f'Parsed {len(raw_data_list)} data infos with {num_workers} '
+            'processes',
+            logger='current')
+        return data_list
+
+    def get_data_info(self, idx: int) -> dict:
+        """Get data info by index, attach the stacked camera matrices and
+        build the 3D boxes of the annotations.
+
+        Args:
+            idx (int): Index of data info.
+
+        Returns:
+            dict: Data info of the corresponding index.
+        """
+        data_info = super().get_data_info(idx)
+        if self.load_type == 'mv_image_based':
+            for img_info in data_info['images'].values():
+                mat_idx = img_info.pop('cam_matrix_idx', None)
+                if mat_idx is None:
+                    continue
+                for key, mats in self.cam_matrices.items():
+                    # the top-level matrices are modified inplace by
+                    # transforms like Resize3D, so they are copied apart
+                    img_info[key] = mats[mat_idx].copy()
+                    data_info[key] = img_info[key].copy()
+            for ann_key in ('ann_info', 'eval_ann_info'):
+                ann_info = data_info.get(ann_key)
+                if ann_info is not None and isinstance(
+                        ann_info['gt_bboxes_3d'], np.ndarray):
+                    ann_info['gt_bboxes_3d'] = CameraInstance3DBoxes(
+                        ann_info['gt_bboxes_3d'])
+        return data_info
+
+    @staticmethod
+    def _stack_cam_matrices(raw_data_list: List[dict]) -> dict:
+        """Stack the camera matrices of all images into columnar arrays.
+
+        The matrices of every image are stacked into a single array of shape
+        (N, 4, 4), where N is the number of images, and removed from the
+        image infos, which only keep their index ``cam_matrix_idx`` in the
+        arrays. This avoids keeping a list-based matrix per image in every
+        data info, and the matrices are attached back in ``get_data_info``.
+        ``lidar2img`` is computed in one batched matmul if it is missing.
+        The stacked matrices are kept in float32 to halve the memory held by
+        every dataloader worker.
+
+        Args:
+            raw_data_list (list[dict]): Raw data infos to be updated inplace.
+
+        Returns:
+            dict: Stacked matrices of the keys that can be stacked.
+        """
+        img_infos = [
+            img_info for info in raw_data_list
+            for img_info in info['images'].values()
+        ]
+        cam_matrices = dict()
+        for key in ('lidar2cam', 'cam2img', 'lidar2img'):
+            if not all(key in img_info for img_info in img_infos):
+                continue
+            try:
+                mats = np.array([img_info[key] for img_info in img_infos])
+            except ValueError:
+                # matrices with different shapes can not be stacked
+                continue
+            if mats.dtype != object:
+                cam_matrices[key] = mats
+        if 'lidar2img' not in cam_matrices and 'lidar2cam' in cam_matrices \
+                and 'cam2img' in cam_matrices:
+            cam_matrices['lidar2img'] = np.matmul(cam_matrices['cam2img'],
+                                                  cam_matrices['lidar2cam'])
+        if 'lidar2img' not in cam_matrices:
+            # fall back to converting the matrices image by image
+            return dict()
+        for key, mats in cam_matrices.items():
+            # float16 is not used since it can not hold the intrinsics
+            # (e.g. focal lengths of ~2000 pixels) precisely enough
+            cam_matrices[key] = mats.astype(np.float32, copy=False)
+        for mat_idx, img_info in enumerate(img_infos):
+            for key in cam_matrices:
+                img_info.pop(key, None)
+            img_info['cam_matrix_idx'] = mat_idx
+        return cam_matrices
+
+    def _get_data_list_cache_file(self) -> Union[str, None]:
+        """Get the path of the parsed data list cache.
+
+        Returns:
+            str or None: Path of the cache file. None if ``ann_file`` is not
+            a local file.
+        """
+        if not osp.isfile(self.ann_file):
+            print_log(
+                f'Skip caching data list since {self.ann_file} is not a '
+                'local file',
+                logger='current')
+            return None
+        key = (_DATA_LIST_CACHE_VERSION, osp.getmtime(self.ann_file),
+               osp.getsize(self.ann_file), self.load_type, self.load_interval,
+               self.cam_sync_instances, self.test_mode,
+               self.load_eval_anns, self.default_cam_key,
+               sorted(self.data_prefix.items()), sorted(self.modality.items()),
+               sorted(self.label_mapping.items()),
+               sorted(self._use_cams_set or ()))
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return f'{self.ann_file}.parsed.{digest}.pkl'
+
+    def _load_data_list_cache(self, cache_file: str) -> Optional[List[dict]]:
+        """Load the parsed data list from cache.
+
+        The stacked camera matrices are memory-mapped from the side-car
+        ``.npy`` file of each key, so that they are shared by the page cache
+        among dataloader workers instead of being unpickled by each of them.
+
+        Args:
+            cache_file (str): Path of the cache file.
+
+        Returns:
+            list[dict], optional: A list of annotation. None if a side-car
+            file is missing.
+        """
+        with open(cache_file, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            cache = pickle.loads(buf)
+        cam_matrix_files = {
+            key: f'{cache_file}.{key}.npy'
+            for key in cache['cam_matrix_keys']
+        }
+        for cam_matrix_file in cam_matrix_files.values():
+            if not osp.isfile(cam_matrix_file):
+                print_log(
+                    f'Ignore {cache_file} since {cam_matrix_file} is missing',
+                    logger='current',
+                    level=logging.WARNING)
+                return None
+        for k, v in cache['metainfo'].items():
+            self._metainfo.setdefault(k, v)
+        self.num_ins_per_cat = cache['num_ins_per_cat']
+        self.cam_matrices = {
+            key: np.load(cam_matrix_file, mmap_mode='r')
+            for key, cam_matrix_file in cam_matrix_files.items()
+        }
+        print_log(f'Load parsed data list from {cache_file}', logger='current')
+        return cache['data_list']
+
+    def _dump_data_list_cache(self, cache_file: str, metainfo: dict,
+                              data_list: List[dict]) -> None:
+        """Dump the parsed data list to cache.
+
+        Args:
+            cache_file (str): Path of the cache file.
+            metainfo (dict): Meta information loaded from annotation file.
+            data_list (list[dict]): A list of annotation.
+        """
+        cam_matrix_keys = list(self.cam_matrices)
+        cache = dict(
+            metainfo=metainfo,
+            data_list=data_list,
+            num_ins_per_cat=self.num_ins_per_cat,
+            cam_matrix_keys=cam_matrix_keys)
+        # write to temporary files first so that concurrent processes
+        # never read a partially written cache. The side-car files of the
+        # camera matrices are written before the data list, whose presence
+        # marks the cache as complete. Each key has its own side-car file,
+        # since the matrices of the keys may have different shapes, e.g.,
+        # 3x4 `cam2img` and 4x4 `lidar2cam`
+        tmp_files = []
+        try:
+            for key in cam_matrix_keys:
+                mat_file = f'{cache_file}.{key}.npy'
+                tmp_files.append(f'{mat_file}.{os.getpid()}.tmp')
+                with open(tmp_files[-1], 'wb') as f:
+                    np.save(f, self.cam_matrices[key])
+                os.replace(tmp_files.pop(), mat_file)
+            tmp_files.append(f'{cache_file}.{os.getpid()}.tmp')
+            with open(tmp_files[-1], 'wb') as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_files.pop(), cache_file)
+        except OSError as e:
+            print_log(
+                f'Failed to cache data list to {cache_file}: {e}',
+                logger='current',
+                level=logging.WARNING)
+            for tmp_file in tmp_files:
+                if osp.exists(tmp_file):
+                    os.remove(tmp_file)
+
     def parse_data_info(self, info: dict) -> Union[dict, List[dict]]:
         """if task is lidar or multiview det, use super() method elif task is
         mono3d, split the info from frame-wise to img-wise."""
@@ -242,48 +572,61 @@ class WaymoDataset(KittiDataset):
         if self.cam_sync_instances:
             info['instances'] = info['cam_sync_instances']
 
-        if self.load_type == 'frame_based':
+        load_type = self.load_type
+        if load_type == 'frame_based':
             return super().parse_data_info(info)
-        elif self.load_type == 'fov_image_based':
+        elif load_type == 'fov_image_based':
             # only loading the fov image and the fov instance
+            default_cam_key = self.default_cam_key
             new_image_info = {}
-            new_image_info[self.default_cam_key] = \
-                info['images'][self.default_cam_key]
+            new_image_info[default_cam_key] = \
+                info['images'][default_cam_key]
             info['images'] = new_image_info
-            info['instances'] = info['cam_instances'][self.default_cam_key]
+            info['instances'] = info['cam_instances'][default_cam_key]
             return Det3DDataset.parse_data_info(self, info)
         else:
             # in the mono3d, the instances is from cam sync.
             # Convert frame-based infos to multi-view image-based
+            img_prefix_tab = self._img_prefix_tab
+            # the annotations are parsed once, as `ann_info` for training
+            # or `eval_ann_info` for evaluation
+            if not self.test_mode:
+                ann_key = 'ann_info'
+            elif self.load_eval_anns:
+                ann_key = 'eval_ann_info'
+            else:
+                ann_key = None
+            # bind the frame-wise fields and attributes used for every
+            # camera to locals before the loop
+            sample_idx = info['sample_idx']
+            timestamp = info['timestamp']
+            context_name = info['context_name']
+            cam_instances = info['cam_instances'] if ann_key else None
+            parse_ann_info = self.parse_ann_info
+            compute_lidar2img = 'lidar2img' not in self.cam_matrices
             data_list = []
             for (cam_key, img_info) in info['images'].items():
-                camera_info = dict()
-                camera_info['sample_idx'] = info['sample_idx']
-                camera_info['timestamp'] = info['timestamp']
-                camera_info['context_name'] = info['context_name']
-                camera_info['images'] = dict()
-                camera_info['images'][cam_key] = img_info
+                camera_info = dict(
+                    sample_idx=sample_idx,
+                    timestamp=timestamp,
+                    context_name=context_name,
+                    images={cam_key: img_info})
                 if 'img_path' in img_info:
-                    cam_prefix = self.data_prefix.get(cam_key, '')
-                    camera_info['images'][cam_key]['img_path'] = osp.join(
-                        cam_prefix, img_info['img_path'])
+                    img_info['img_path'] = img_prefix_tab.get(
+                        cam_key, '') + img_info['img_path']
+                # the stacked matrices are attached in `get_data_info`
                 if 'lidar2cam' in img_info:
                     camera_info['lidar2cam'] = np.array(img_info['lidar2cam'])
                 if 'cam2img' in img_info:
                     camera_info['cam2img'] = np.array(img_info['cam2img'])
                 if 'lidar2img' in img_info:
                     camera_info['lidar2img'] = np.array(img_info['lidar2img'])
-                else:
+                elif compute_lidar2img:
                     camera_info['lidar2img'] = camera_info[
                         'cam2img'] @ camera_info['lidar2cam']
 
-                if not self.test_mode:
-                    # used in training
-                    camera_info['instances'] = info['cam_instances'][cam_key]
-                    camera_info['ann_info'] = self.parse_ann_info(camera_info)
-                if self.test_mode and self.load_eval_anns:
-                    camera_info['instances'] = info['cam_instances'][cam_key]
-                    camera_info['eval_ann_info'] = self.parse_ann_info(
-                        camera_info)
+                if ann_key is not None:
+                    camera_info['instances'] = cam_instances[cam_key]
+                    camera_info[ann_key] = parse_ann_info(camera_info)
                 data_list.append(camera_info)
             return data_list
@@ -1,4 +1,5 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+from .batch_augments import BatchGlobalRotScaleFlip3D
 from .data_preprocessor import Det3DDataPreprocessor
 
-__all__ = ['Det3DDataPreprocessor']
+__all__ = ['Det3DDataPreprocessor', 'BatchGlobalRotScaleFlip3D']
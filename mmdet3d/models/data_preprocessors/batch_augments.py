@@ -0,0 +1,161 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch import Tensor, nn
+
+from mmdet3d.registry import MODELS
+from mmdet3d.structures import LiDARInstance3DBoxes
+from mmdet3d.structures.det3d_data_sample import SampleList
+
+
+@MODELS.register_module()
+class BatchGlobalRotScaleFlip3D(nn.Module):
+    """Batch-level global flip, rotation, scaling and translation of point
+    clouds and 3D boxes, performed on the device of the inputs.
+
+    It is the batched counterpart of ``RandomFlip3D``,
+    ``GlobalRotScaleTrans``, ``PointsRangeFilter``, ``ObjectRangeFilter`` and
+    ``PointShuffle`` in the data pipeline for LiDAR-based detectors. The
+    flip, rotation and scaling of each sample are composed into a single
+    3x3 matrix, so that each point cloud is transformed by one matmul.
+
+    Note:
+        The sampled transformation is not recorded in the meta information
+        of data samples, so it should only be used for LiDAR-only detectors
+        during training.
+
+    Args:
+        flip_ratio_bev_horizontal (float): The flipping probability
+            in horizontal direction. Defaults to 0.0.
+        flip_ratio_bev_vertical (float): The flipping probability
+            in vertical direction. Defaults to 0.0.
+        rot_range (Sequence[float]): Range of rotation angle.
+            Defaults to [-0.78539816, 0.78539816] (close to [-pi/4, pi/4]).
+        scale_ratio_range (Sequence[float]): Range of scale ratio.
+            Defaults to [0.95, 1.05].
+        translation_std (Sequence[float]): The standard deviation of
+            translation noise applied to a scene, which
+            is sampled from a gaussian distribution whose standard deviation
+            is set by ``translation_std``. Defaults to [0, 0, 0].
+        point_cloud_range (Sequence[float], optional): Point cloud range. If
+            given, points and boxes out of the range are removed.
+            Defaults to None.
+        shuffle_points (bool): Whether to shuffle the points.
+            Defaults to True.
+    """
+
+    def __init__(self,
+                 flip_ratio_bev_horizontal: float = 0.0,
+                 flip_ratio_bev_vertical: float = 0.0,
+                 rot_range: Sequence[float] = [-0.78539816, 0.78539816],
+                 scale_ratio_range: Sequence[float] = [0.95, 1.05],
+                 translation_std: Sequence[float] = [0, 0, 0],
+                 point_cloud_range: Optional[Sequence[float]] = None,
+                 shuffle_points: bool = True) -> None:
+        super().__init__()
+        assert 0 <= flip_ratio_bev_horizontal <= 1
+        assert 0 <= flip_ratio_bev_vertical <= 1
+        assert len(rot_range) == 2 and len(scale_ratio_range) == 2
+        assert len(translation_std) == 3
+        self.flip_ratio_bev_horizontal = flip_ratio_bev_horizontal
+        self.flip_ratio_bev_vertical = flip_ratio_bev_vertical
+        self.rot_range = rot_range
+        self.scale_ratio_range = scale_ratio_range
+        self.translation_std = translation_std
+        self.point_cloud_range = point_cloud_range
+        self.shuffle_points = shuffle_points
+
+    def _sample_transforms(self, batch_size: int,
+                           ref: Tensor) -> Tuple[Tensor, ...]:
+        """Sample the transformations of a batch.
+
+        Args:
+            batch_size (int): Batch size.
+            ref (Tensor): Reference tensor for dtype and device.
+
+        Returns:
+            tuple[Tensor]: Transposed transformation matrices in shape
+            (B, 3, 3), rotation angles, scale factors, horizontal and
+            vertical flipping flags and translations in shape (B, 3).
+        """
+        angles = ref.new_empty(batch_size).uniform_(*self.rot_range)
+        scales = ref.new_empty(batch_size).uniform_(*self.scale_ratio_range)
+        flip_h = torch.rand(
+            batch_size, device=ref.device) < self.flip_ratio_bev_horizontal
+        flip_v = torch.rand(
+            batch_size, device=ref.device) < self.flip_ratio_bev_vertical
+        trans = ref.new_empty(batch_size, 3).normal_() * ref.new_tensor(
+            self.translation_std)
+
+        rot_sin = torch.sin(angles)
+        rot_cos = torch.cos(angles)
+        ones = torch.ones_like(rot_cos)
+        zeros = torch.zeros_like(rot_cos)
+        # same as the `rot_mat_T` of `rotation_3d_in_axis` along z axis
+        rot_mat_T = torch.stack([
+            torch.stack([rot_cos, rot_sin, zeros]),
+            torch.stack([-rot_sin, rot_cos, zeros]),
+            torch.stack([zeros, zeros, ones])
+        ]).permute(2, 0, 1)
+        flip_mat = torch.diag_embed(
+            torch.stack([1 - 2 * flip_v.to(ref), 1 - 2 * flip_h.to(ref), ones],
+                        dim=-1))
+        trans_mat_T = flip_mat @ rot_mat_T * scales.view(-1, 1, 1)
+        return trans_mat_T, angles, scales, flip_h, flip_v, trans
+
+    def forward(self, points: List[Tensor],
+                data_samples: SampleList) -> Tuple[List[Tensor], SampleList]:
+        """Augment a batch of point clouds and the 3D boxes in data samples.
+
+        Args:
+            points (List[Tensor]): Point clouds of each sample.
+            data_samples (List[:obj:`Det3DDataSample`]): The data samples
+                containing ``gt_instances_3d``.
+
+        Returns:
+            tuple: The augmented point clouds and data samples.
+        """
+        trans_mat_T, angles, scales, flip_h, flip_v, trans = \
+            self._sample_transforms(len(points), points[0])
+
+        aug_points = []
+        for i, (pts, data_sample) in enumerate(zip(points, data_samples)):
+            pts = pts.clone()
+            pts[:, :3] = pts[:, :3] @ trans_mat_T[i] + trans[i]
+
+            gt_instances_3d = data_sample.gt_instances_3d
+            bboxes_3d = gt_instances_3d.bboxes_3d
+            assert isinstance(bboxes_3d, LiDARInstance3DBoxes), \
+                'Only LiDAR boxes are supported in batch augmentation'
+            boxes = bboxes_3d.tensor.clone()
+            boxes[:, :3] = boxes[:, :3] @ trans_mat_T[i] + trans[i]
+            boxes[:, 3:6] *= scales[i]
+            # flipping along one of x and y axis negates the yaw, and
+            # flipping along x axis adds pi to it
+            yaw = torch.where(flip_h[i] ^ flip_v[i], -boxes[:, 6], boxes[:, 6])
+            boxes[:, 6] = yaw + flip_v[i].to(yaw) * np.pi + angles[i]
+            if boxes.shape[1] > 7:
+                # velocity
+                boxes[:, 7:9] = boxes[:, 7:9] @ trans_mat_T[i, :2, :2]
+            bboxes_3d = bboxes_3d.new_box(boxes)
+
+            if self.point_cloud_range is not None:
+                pcd_range = pts.new_tensor(self.point_cloud_range)
+                in_range = ((pts[:, :3] > pcd_range[:3]) &
+                            (pts[:, :3] < pcd_range[3:])).all(dim=1)
+                pts = pts[in_range]
+
+                box_mask = bboxes_3d.in_range_bev(pcd_range[[0, 1, 3, 4]])
+                gt_instances_3d.bboxes_3d = bboxes_3d
+                gt_instances_3d = gt_instances_3d[box_mask]
+                bboxes_3d = gt_instances_3d.bboxes_3d
+                bboxes_3d.limit_yaw(offset=0.5, period=2 * np.pi)
+            gt_instances_3d.bboxes_3d = bboxes_3d
+            data_sample.gt_instances_3d = gt_instances_3d
+
+            if self.shuffle_points:
+                pts = pts[torch.randperm(pts.shape[0], device=pts.device)]
+            aug_points.append(pts)
+        return aug_points, data_samples
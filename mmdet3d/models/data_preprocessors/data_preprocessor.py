@@ -9,7 +9,7 @@ from mmdet.models import DetDataPreprocessor
 from mmdet.models.utils.misc import samplelist_boxtype2tensor
 from mmengine.model import stack_batch
 from mmengine.utils import is_seq_of
-from torch import Tensor
+from torch import Tensor, nn
 from torch.nn import functional as F
 
 from mmdet3d.registry import MODELS
@@ -41,6 +41,7 @@ class Det3DDataPreprocessor(DetDataPreprocessor):
 
     - 2) For point cloud data:
 
+      - Do batch augmentations of point clouds during training.
       - If no voxelization, directly return list of point cloud data.
       - If voxelization is applied, voxelize point cloud according to
         ``voxel_type`` and obtain ``voxels``.
@@ -81,6 +82,10 @@ class Det3DDataPreprocessor(DetDataPreprocessor):
             data to device. Defaults to False.
         batch_augments (List[dict], optional): Batch-level augmentations.
             Defaults to None.
+        points_batch_augments (List[dict], optional): Batch-level
+            augmentations of point clouds, e.g.
+            :class:`BatchGlobalRotScaleFlip3D`. They are applied before
+            voxelization during training. Defaults to None.
     """
 
     def __init__(self,
@@ -101,7 +106,8 @@ class Det3DDataPreprocessor(DetDataPreprocessor):
                  rgb_to_bgr: bool = False,
                  boxtype2tensor: bool = True,
                  non_blocking: bool = False,
-                 batch_augments: Optional[List[dict]] = None) -> None:
+                 batch_augments: Optional[List[dict]] = None,
+                 points_batch_augments: Optional[List[dict]] = None) -> None:
         super(Det3DDataPreprocessor, self).__init__(
             mean=mean,
             std=std,
@@ -120,6 +126,11 @@ class Det3DDataPreprocessor(DetDataPreprocessor):
         self.voxel_type = voxel_type
         self.batch_first = batch_first
         self.max_voxels = max_voxels
+        if points_batch_augments is not None:
+            self.points_batch_augments = nn.ModuleList(
+                [MODELS.build(aug) for aug in points_batch_augments])
+        else:
+            self.points_batch_augments = None
         if voxel:
             self.voxel_layer = VoxelizationByGridShape(**voxel_layer)
 
@@ -172,10 +183,14 @@ class Det3DDataPreprocessor(DetDataPreprocessor):
         batch_inputs = dict()
 
         if 'points' in inputs:
-            batch_inputs['points'] = inputs['points']
+            points = inputs['points']
+            if training and self.points_batch_augments is not None:
+                for batch_aug in self.points_batch_augments:
+                    points, data_samples = batch_aug(points, data_samples)
+            batch_inputs['points'] = points
 
             if self.voxel:
-                voxel_dict = self.voxelize(inputs['points'], data_samples)
+                voxel_dict = self.voxelize(points, data_samples)
                 batch_inputs['voxels'] = voxel_dict
 
         if 'imgs' in inputs:
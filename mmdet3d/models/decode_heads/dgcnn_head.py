@@ -64,7 +64,9 @@ class DGCNNHead(Base3DDecodeHead):
         fa_points = self._extract_input(feat_dict)
 
         fp_points = self.FP_module(fa_points)
-        fp_points = fp_points.transpose(1, 2).contiguous()
+        # transposing back the view returned by the FP module gives the
+        # contiguous (B, C, N) features without copying
+        fp_points = fp_points.transpose(1, 2)
         output = self.pre_seg_conv(fp_points)
         output = self.cls_seg(output)
 
@@ -50,13 +50,14 @@ class DGCNNFPModule(BaseModule):
             points (Tensor): (B, N, C) Tensor of the input points.
 
         Returns:
-            Tensor: (B, N, M) M = mlp[-1]. Tensor of the new points.
+            Tensor: (B, N, M) M = mlp[-1]. Tensor of the new points, which is
+            a transposed view of the contiguous (B, M, N) mlp output.
         """
 
         if points is not None:
             new_points = points.transpose(1, 2).contiguous()  # (B, C, N)
             new_points = self.mlps(new_points)
-            new_points = new_points.transpose(1, 2).contiguous()
+            new_points = new_points.transpose(1, 2)
         else:
             new_points = points
 
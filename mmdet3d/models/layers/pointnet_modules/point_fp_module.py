@@ -1,15 +1,56 @@
 # Copyright (c) OpenMMLab. All rights reserved.
-from typing import List
+import warnings
+from typing import Callable, List, Tuple
 
 import torch
 from mmcv.cnn import ConvModule
 from mmcv.ops import three_interpolate, three_nn
 from mmengine.model import BaseModule
+from mmengine.utils import digit_version
+from mmengine.utils.dl_utils import TORCH_VERSION
 from torch import Tensor
 from torch import nn as nn
 
 from mmdet3d.utils import ConfigType, OptMultiConfig
 
+try:
+    from pykeops.torch import LazyTensor
+except ImportError:
+    LazyTensor = None
+
+# norm layer types supported by the Conv1d mlps, mapped to their 1D types
+_NORM_1D_TYPES = {
+    'BN': 'BN1d',
+    'BN1d': 'BN1d',
+    'BN2d': 'BN1d',
+    'SyncBN': 'SyncBN',
+    'IN': 'IN1d',
+    'IN1d': 'IN1d',
+    'IN2d': 'IN1d',
+    'GN': 'GN'
+}
+
+# `_mlps_forward` compiled by `torch.compile` on the first use
+_compiled_mlps_forward = None
+
+
+def _mlps_forward(mlps: nn.Module, features: Tensor) -> Tensor:
+    return mlps(features)
+
+
+def _get_compiled_mlps_forward() -> Callable[[nn.Module, Tensor], Tensor]:
+    """Get the compiled forward of the mlps.
+
+    The mlps are passed as an argument instead of being captured, so that the
+    compiled function always runs the weights of the calling module, e.g.,
+    after the module is deep copied for EMA.
+    """
+    global _compiled_mlps_forward
+    if _compiled_mlps_forward is None:
+        _compiled_mlps_forward = torch.compile(
+            _mlps_forward, mode='reduce-overhead', dynamic=True)
+    return _compiled_mlps_forward
+
 
 class PointFPModule(BaseModule):
     """Point feature propagation module used in PointNets.
@@ -19,16 +60,70 @@ class PointFPModule(BaseModule):
     Args:
         mlp_channels (list[int]): List of mlp channels.
         norm_cfg (:obj:`ConfigDict` or dict): Config dict for normalization
-            layer. Defaults to dict(type='BN2d').
+            layer. 2D norm layers like 'BN' and 'BN2d' are replaced by their
+            1D counterparts as the mlps are built with Conv1d. Only 'BN',
+            'SyncBN', 'IN' and 'GN' types are supported.
+            Defaults to dict(type='BN1d').
+        torch_nn_max_pairs (int): Maximum number of target-source point pairs
+            per sample to find the three nearest neighbors and interpolate
+            the features with pure PyTorch ops, which is faster than the
+            `three_nn` and `three_interpolate` kernels for small point sets
+            at the cost of O(n * m) memory. Defaults to 4194304.
+        keops_min_pairs (int): Minimum number of target-source point pairs
+            per sample to find the three nearest neighbors with KeOps
+            instead of the `three_nn` kernel on GPU, if pykeops is
+            installed. The PyTorch ops take precedence, so it must be larger
+            than ``torch_nn_max_pairs``. Defaults to 16777216.
+        enable_amp (bool): Whether to compute the interpolation weights and
+            interpolate the features in bfloat16 on the PyTorch path, which
+            halves the memory traffic of the interpolation. The
+            `three_interpolate` kernel has no bfloat16 support, so its path
+            stays in the feature dtype. Defaults to False.
+        compile_mlps (bool): Whether to compile the mlps with
+            `torch.compile`, which reduces the overhead of launching the
+            small kernels of the mlps. Requires PyTorch>=2.1.
+            Defaults to False.
+        use_cuda_graph (bool): Whether to capture the forward in a CUDA
+            graph for each shape of the inputs and replay it in inference,
+            which saves launching the kernels one by one. Only used in eval
+            mode without grad, and not for the inputs searched by KeOps. The
+            graphs and their static buffers are kept for at most
+            ``max_cuda_graphs`` shapes, beyond which the forward runs
+            eagerly. Cannot be used with ``compile_mlps``, whose
+            'reduce-overhead' mode already uses CUDA graphs.
+            Defaults to False.
         init_cfg (:obj:`ConfigDict` or dict or List[:obj:`Contigdict` or dict],
             optional): Initialization config dict. Defaults to None.
     """
 
+    # maximum number of input shapes captured in CUDA graphs
+    max_cuda_graphs = 8
+
     def __init__(self,
                  mlp_channels: List[int],
-                 norm_cfg: ConfigType = dict(type='BN2d'),
+                 norm_cfg: ConfigType = dict(type='BN1d'),
+                 torch_nn_max_pairs: int = 4194304,
+                 keops_min_pairs: int = 16777216,
+                 enable_amp: bool = False,
+                 compile_mlps: bool = False,
+                 use_cuda_graph: bool = False,
                  init_cfg: OptMultiConfig = None) -> None:
         super(PointFPModule, self).__init__(init_cfg=init_cfg)
+        assert not (use_cuda_graph and compile_mlps), \
+            'use_cuda_graph and compile_mlps cannot be both set'
+        self.torch_nn_max_pairs = torch_nn_max_pairs
+        assert keops_min_pairs > torch_nn_max_pairs, \
+            'keops_min_pairs should be larger than torch_nn_max_pairs'
+        self.keops_min_pairs = keops_min_pairs
+        self.use_cuda_graph = use_cuda_graph
+        self._cuda_graphs = dict()
+        self.enable_amp = enable_amp
+        norm_cfg = dict(norm_cfg)
+        if norm_cfg['type'] not in _NORM_1D_TYPES:
+            raise ValueError(
+                f'Unsupported norm type {norm_cfg["type"]} for the Conv1d '
+                f'mlps, expected one of {list(_NORM_1D_TYPES)}')
+        norm_cfg['type'] = _NORM_1D_TYPES[norm_cfg['type']]
         self.mlps = nn.Sequential()
         for i in range(len(mlp_channels) - 1):
             self.mlps.add_module(
@@ -36,11 +131,114 @@ class PointFPModule(BaseModule):
                 ConvModule(
                     mlp_channels[i],
                     mlp_channels[i + 1],
-                    kernel_size=(1, 1),
-                    stride=(1, 1),
-                    conv_cfg=dict(type='Conv2d'),
+                    kernel_size=1,
+                    stride=1,
+                    conv_cfg=dict(type='Conv1d'),
                     norm_cfg=norm_cfg))
 
+        self.compile_mlps = compile_mlps
+        if compile_mlps and \
+                digit_version(TORCH_VERSION) < digit_version('2.1.0'):
+            warnings.warn('compile_mlps requires PyTorch>=2.1, '
+                          'the mlps are not compiled')
+            self.compile_mlps = False
+
+    @staticmethod
+    def _three_nn_torch(target: Tensor, source: Tensor) -> Tuple[Tensor]:
+        """Find the three nearest neighbors with the pairwise distances.
+
+        Args:
+            target (Tensor): (B, n, 3) Tensor of the target positions.
+            source (Tensor): (B, m, 3) Tensor of the source positions.
+
+        Returns:
+            tuple[Tensor]: (B, n, 3) Tensors of the distances and indices of
+            the three nearest neighbors.
+        """
+        # same as `three_nn`, the neighbors are not differentiable
+        with torch.no_grad():
+            # the matmul based distances of large point sets lose precision
+            # for the target points coinciding with the source points
+            dist = torch.cdist(
+                target, source, compute_mode='donot_use_mm_for_euclid_dist')
+            return dist.topk(3, dim=2, largest=False, sorted=False)
+
+    @staticmethod
+    def _three_nn_keops(target: Tensor, source: Tensor) -> Tuple[Tensor]:
+        """Find the three nearest neighbors with KeOps, which reduces the
+        pairwise distances without materializing them.
+
+        Args:
+            target (Tensor): (B, n, 3) Tensor of the target positions.
+            source (Tensor): (B, m, 3) Tensor of the source positions.
+
+        Returns:
+            tuple[Tensor]: (B, n, 3) Tensors of the distances and indices of
+            the three nearest neighbors.
+        """
+        with torch.no_grad():
+            target_i = LazyTensor(target.contiguous()[:, :, None, :])
+            source_j = LazyTensor(source.contiguous()[:, None, :, :])
+            dist2_ij = ((target_i - source_j)**2).sum(-1)
+            dist2, idx = dist2_ij.Kmin_argKmin(3, dim=2)
+        # the indices of `three_nn` are int32
+        return dist2.sqrt(), idx.int()
+
+    def _use_keops(self, target: Tensor, source: Tensor) -> bool:
+        """Whether to search the neighbors of the point sets with KeOps."""
+        return LazyTensor is not None and target.is_cuda and \
+            target.size(1) * source.size(1) >= self.keops_min_pairs
+
+    def _three_nn_weighted(self, target: Tensor, source: Tensor,
+                           use_torch_nn: bool) -> Tuple[Tensor]:
+        """Find the three nearest neighbors and their inverse distance
+        weights.
+
+        Args:
+            target (Tensor): (B, n, 3) Tensor of the target positions.
+            source (Tensor): (B, m, 3) Tensor of the source positions.
+            use_torch_nn (bool): Whether to search the neighbors with pure
+                PyTorch ops instead of the `three_nn` kernel.
+
+        Returns:
+            tuple[Tensor]: (B, n, 3) Tensors of the indices and normalized
+            weights of the three nearest neighbors.
+        """
+        if use_torch_nn:
+            dist, idx = self._three_nn_torch(target, source)
+        elif self._use_keops(target, source):
+            dist, idx = self._three_nn_keops(target, source)
+        else:
+            dist, idx = three_nn(target, source)
+        if self.enable_amp and use_torch_nn:
+            dist = dist.to(torch.bfloat16)
+        if dist.requires_grad:
+            dist_reciprocal = 1.0 / (dist + 1e-8)
+            norm = torch.sum(dist_reciprocal, dim=2, keepdim=True)
+            return idx, dist_reciprocal / norm
+        # `dist` is not used elsewhere, so the weights reuse its memory
+        weight = dist.add_(1e-8).reciprocal_()
+        return idx, weight.div_(weight.sum(dim=2, keepdim=True))
+
+    @staticmethod
+    def _three_interpolate_torch(feats: Tensor, idx: Tensor,
+                                 weight: Tensor) -> Tensor:
+        """Interpolate the features of the three nearest neighbors.
+
+        Args:
+            feats (Tensor): (B, C, m) Tensor of the source features.
+            idx (Tensor): (B, n, 3) Tensor of the neighbor indices.
+            weight (Tensor): (B, n, 3) Tensor of the neighbor weights.
+
+        Returns:
+            Tensor: (B, C, n) Tensor of the interpolated features.
+        """
+        B, C, _ = feats.shape
+        n = idx.size(1)
+        neighbor_feats = feats.gather(2,
+                                      idx.view(B, 1, n * 3).expand(-1, C, -1))
+        return (neighbor_feats.view(B, C, n, 3) * weight.unsqueeze(1)).sum(-1)
+
     def forward(self, target: Tensor, source: Tensor, target_feats: Tensor,
                 source_feats: Tensor) -> Tensor:
         """Forward.
@@ -58,13 +256,63 @@ class PointFPModule(BaseModule):
         Return:
             Tensor: (B, M, N) M = mlp[-1], Tensor of the target features.
         """
-        if source is not None:
-            dist, idx = three_nn(target, source)
-            dist_reciprocal = 1.0 / (dist + 1e-8)
-            norm = torch.sum(dist_reciprocal, dim=2, keepdim=True)
-            weight = dist_reciprocal / norm
+        # KeOps launches its own kernels, which cannot be captured
+        if self.use_cuda_graph and source_feats.is_cuda and \
+                not self.training and not torch.is_grad_enabled() and \
+                (source is None or not self._use_keops(target, source)):
+            return self._forward_cuda_graph(target, source, target_feats,
+                                            source_feats)
+        return self._forward(target, source, target_feats, source_feats)
+
+    def _forward_cuda_graph(self, *inputs: Tensor) -> Tensor:
+        """Replay the forward captured in a CUDA graph for the shapes of the
+        inputs, which is captured in the first call with the shapes.
 
-            interpolated_feats = three_interpolate(source_feats, idx, weight)
+        Args:
+            inputs (Tensor): The inputs of :meth:`forward`.
+
+        Returns:
+            Tensor: (B, M, N) M = mlp[-1], Tensor of the target features.
+        """
+        key = tuple(None if x is None else (x.shape, x.dtype, x.device)
+                    for x in inputs)
+        if key not in self._cuda_graphs:
+            if len(self._cuda_graphs) >= self.max_cuda_graphs:
+                return self._forward(*inputs)
+            static_inputs = [None if x is None else x.clone() for x in inputs]
+            # warm up on a side stream before capturing
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                self._forward(*static_inputs)
+            torch.cuda.current_stream().wait_stream(stream)
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph):
+                static_output = self._forward(*static_inputs)
+            self._cuda_graphs[key] = (graph, static_inputs, static_output)
+        graph, static_inputs, static_output = self._cuda_graphs[key]
+        for static_input, x in zip(static_inputs, inputs):
+            if x is not None:
+                static_input.copy_(x)
+        graph.replay()
+        # the output buffer is overwritten by the next replay
+        return static_output.clone()
+
+    def _forward(self, target: Tensor, source: Tensor, target_feats: Tensor,
+                 source_feats: Tensor) -> Tensor:
+        """Forward without CUDA graphs, see :meth:`forward`."""
+        if source is not None:
+            num_source = source.size(1)
+            use_torch_nn = 3 <= num_source and \
+                target.size(1) * num_source <= self.torch_nn_max_pairs
+            idx, weight = self._three_nn_weighted(target, source, use_torch_nn)
+            if use_torch_nn:
+                interpolated_feats = self._three_interpolate_torch(
+                    source_feats.to(weight.dtype), idx,
+                    weight).to(source_feats.dtype)
+            else:
+                interpolated_feats = three_interpolate(source_feats, idx,
+                                                       weight)
         else:
             interpolated_feats = source_feats.expand(*source_feats.size()[0:2],
                                                      target.size(1))
@@ -75,7 +323,22 @@ class PointFPModule(BaseModule):
         else:
             new_features = interpolated_feats
 
-        new_features = new_features.unsqueeze(-1)
-        new_features = self.mlps(new_features)
+        if self.compile_mlps:
+            return _get_compiled_mlps_forward()(self.mlps, new_features)
+        return self.mlps(new_features)
 
-        return new_features.squeeze(-1)
+    def _load_from_state_dict(self, state_dict: dict, prefix: str,
+                              local_metadata: dict, strict: bool,
+                              missing_keys: List[str],
+                              unexpected_keys: List[str],
+                              error_msgs: List[str]) -> None:
+        """Squeeze the (1, 1) kernels of the Conv2d mlps in old checkpoints
+        to load them into Conv1d."""
+        for name in self.mlps._modules:
+            key = f'{prefix}mlps.{name}.conv.weight'
+            weight = state_dict.get(key)
+            if weight is not None and weight.dim() == 4:
+                state_dict[key] = weight.squeeze(-1)
+        super()._load_from_state_dict(state_dict, prefix, local_metadata,
+                                      strict, missing_keys, unexpected_keys,
+                                      error_msgs)
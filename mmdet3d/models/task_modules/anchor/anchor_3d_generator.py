@@ -109,6 +109,15 @@ class Anchor3DRangeGenerator(object):
                 num_base_anchors is the number of anchors for that level.
         """
         assert self.num_levels == len(featmap_sizes)
+        # anchors only depend on the feature map sizes and the device, so
+        # the anchors of the last call are reused if these match. Only one
+        # entry is kept to bound the memory with variable-size inputs
+        cache_key = (tuple(
+            tuple(int(s) for s in featmap_size)
+            for featmap_size in featmap_sizes), str(device))
+        if self.cached_anchors is not None and \
+                self.cached_anchors[0] == cache_key:
+            return list(self.cached_anchors[1])
         multi_level_anchors = []
         for i in range(self.num_levels):
             anchors = self.single_level_grid_anchors(
@@ -116,7 +125,8 @@ class Anchor3DRangeGenerator(object):
             if self.reshape_out:
                 anchors = anchors.reshape(-1, anchors.size(-1))
             multi_level_anchors.append(anchors)
-        return multi_level_anchors
+        self.cached_anchors = (cache_key, multi_level_anchors)
+        return list(multi_level_anchors)
 
     def single_level_grid_anchors(
             self,
@@ -1,7 +1,10 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import math
+from collections import OrderedDict
 from enum import IntEnum, unique
-from typing import Optional, Sequence, Union
+from typing import Callable, List, Optional, Sequence, Tuple, Union
 
+import numba
 import numpy as np
 import torch
 from torch import Tensor
@@ -71,7 +74,8 @@ class Box3DMode(IntEnum):
         dst: 'Box3DMode',
         rt_mat: Optional[Union[np.ndarray, Tensor]] = None,
         with_yaw: bool = True,
-        correct_yaw: bool = False
+        correct_yaw: bool = False,
+        return_yaw_vector: bool = False
     ) -> Union[Sequence[float], np.ndarray, Tensor, BaseInstance3DBoxes]:
         """Convert boxes from ``src`` mode to ``dst`` mode.
 
@@ -92,6 +96,11 @@ class Box3DMode(IntEnum):
                 Defaults to True.
             correct_yaw (bool): If the yaw is rotated by rt_mat.
                 Defaults to False.
+            return_yaw_vector (bool): Whether to return the cosine and sine of
+                the rotated yaw in place of the yaw, which saves computing the
+                angle by ``atan2``. Only supported with ``correct_yaw``, and
+                the boxes are k+1 wide. ``BaseInstance3DBoxes`` are returned as
+                a Tensor in this case. Defaults to False.
 
         Returns:
             Sequence[float] or np.ndarray or Tensor or
@@ -107,143 +116,41 @@ class Box3DMode(IntEnum):
             assert len(box) >= 7, (
                 'Box3DMode.convert takes either a k-tuple/list or '
                 'an Nxk array/tensor, where k >= 7')
+            if rt_mat is None and not correct_yaw and \
+                    (src, dst) in _BOX_TRANSFORMS:
+                # a single box is cheaper to convert without tensors
+                return type(box)(_convert_single_box(box, src, dst, with_yaw))
             arr = torch.tensor(box)[None, :]
         else:
-            # avoid modifying the input box
+            # the input box is only read, as the converted boxes are written
+            # to a new tensor
             if is_numpy:
-                arr = torch.from_numpy(np.asarray(box)).clone()
+                # the kernel does no bounds checking and is only compiled
+                # for float32 and float64 boxes
+                if not correct_yaw and box.ndim == 2 and \
+                        (box.shape[1] >= 7 or not with_yaw) and \
+                        box.dtype in (np.float32, np.float64) and \
+                        not isinstance(rt_mat, Tensor) and \
+                        (src, dst) in _BOX_TRANSFORMS:
+                    # numpy boxes are cheaper to convert without tensors
+                    return _convert_numpy(box, src, dst, rt_mat, with_yaw)
+                arr = torch.from_numpy(np.asarray(box))
             elif is_Instance3DBoxes:
-                arr = box.tensor.clone()
+                arr = box.tensor
             else:
-                arr = box.clone()
+                arr = box
 
         if is_Instance3DBoxes:
             with_yaw = box.with_yaw
+        assert not return_yaw_vector or (with_yaw and correct_yaw), \
+            'return_yaw_vector is only supported for boxes with yaw and ' \
+            'correct_yaw=True'
 
         # convert box from `src` mode to `dst` mode.
-        x_size, y_size, z_size = arr[..., 3:4], arr[..., 4:5], arr[..., 5:6]
-        if with_yaw:
-            yaw = arr[..., 6:7]
-        if src == Box3DMode.LIDAR and dst == Box3DMode.CAM:
-            if rt_mat is None:
-                rt_mat = arr.new_tensor([[0, -1, 0], [0, 0, -1], [1, 0, 0]])
-            xyz_size = torch.cat([x_size, z_size, y_size], dim=-1)
-            if with_yaw:
-                if correct_yaw:
-                    yaw_vector = torch.cat([
-                        torch.cos(yaw),
-                        torch.sin(yaw),
-                        torch.zeros_like(yaw)
-                    ],
-                                           dim=1)
-                else:
-                    yaw = -yaw - np.pi / 2
-                    yaw = limit_period(yaw, period=np.pi * 2)
-        elif src == Box3DMode.CAM and dst == Box3DMode.LIDAR:
-            if rt_mat is None:
-                rt_mat = arr.new_tensor([[0, 0, 1], [-1, 0, 0], [0, -1, 0]])
-            xyz_size = torch.cat([x_size, z_size, y_size], dim=-1)
-            if with_yaw:
-                if correct_yaw:
-                    yaw_vector = torch.cat([
-                        torch.cos(-yaw),
-                        torch.zeros_like(yaw),
-                        torch.sin(-yaw)
-                    ],
-                                           dim=1)
-                else:
-                    yaw = -yaw - np.pi / 2
-                    yaw = limit_period(yaw, period=np.pi * 2)
-        elif src == Box3DMode.DEPTH and dst == Box3DMode.CAM:
-            if rt_mat is None:
-                rt_mat = arr.new_tensor([[1, 0, 0], [0, 0, -1], [0, 1, 0]])
-            xyz_size = torch.cat([x_size, z_size, y_size], dim=-1)
-            if with_yaw:
-                if correct_yaw:
-                    yaw_vector = torch.cat([
-                        torch.cos(yaw),
-                        torch.sin(yaw),
-                        torch.zeros_like(yaw)
-                    ],
-                                           dim=1)
-                else:
-                    yaw = -yaw
-        elif src == Box3DMode.CAM and dst == Box3DMode.DEPTH:
-            if rt_mat is None:
-                rt_mat = arr.new_tensor([[1, 0, 0], [0, 0, 1], [0, -1, 0]])
-            xyz_size = torch.cat([x_size, z_size, y_size], dim=-1)
-            if with_yaw:
-                if correct_yaw:
-                    yaw_vector = torch.cat([
-                        torch.cos(-yaw),
-                        torch.zeros_like(yaw),
-                        torch.sin(-yaw)
-                    ],
-                                           dim=1)
-                else:
-                    yaw = -yaw
-        elif src == Box3DMode.LIDAR and dst == Box3DMode.DEPTH:
-            if rt_mat is None:
-                rt_mat = arr.new_tensor([[0, -1, 0], [1, 0, 0], [0, 0, 1]])
-            xyz_size = torch.cat([x_size, y_size, z_size], dim=-1)
-            if with_yaw:
-                if correct_yaw:
-                    yaw_vector = torch.cat([
-                        torch.cos(yaw),
-                        torch.sin(yaw),
-                        torch.zeros_like(yaw)
-                    ],
-                                           dim=1)
-                else:
-                    yaw = yaw + np.pi / 2
-                    yaw = limit_period(yaw, period=np.pi * 2)
-        elif src == Box3DMode.DEPTH and dst == Box3DMode.LIDAR:
-            if rt_mat is None:
-                rt_mat = arr.new_tensor([[0, 1, 0], [-1, 0, 0], [0, 0, 1]])
-            xyz_size = torch.cat([x_size, y_size, z_size], dim=-1)
-            if with_yaw:
-                if correct_yaw:
-                    yaw_vector = torch.cat([
-                        torch.cos(yaw),
-                        torch.sin(yaw),
-                        torch.zeros_like(yaw)
-                    ],
-                                           dim=1)
-                else:
-                    yaw = yaw - np.pi / 2
-                    yaw = limit_period(yaw, period=np.pi * 2)
-        else:
-            raise NotImplementedError(
-                f'Conversion from Box3DMode {src} to {dst} '
-                'is not supported yet')
-
-        if not isinstance(rt_mat, Tensor):
-            rt_mat = arr.new_tensor(rt_mat)
-        if rt_mat.size(1) == 4:
-            extended_xyz = torch.cat(
-                [arr[..., :3], arr.new_ones(arr.size(0), 1)], dim=-1)
-            xyz = extended_xyz @ rt_mat.t()
-        else:
-            xyz = arr[..., :3] @ rt_mat.t()
-
-        # Note: we only use rotation in rt_mat
-        # so don't need to extend yaw_vector
-        if with_yaw and correct_yaw:
-            rot_yaw_vector = yaw_vector @ rt_mat[:3, :3].t()
-            if dst == Box3DMode.CAM:
-                yaw = torch.atan2(-rot_yaw_vector[:, [2]], rot_yaw_vector[:,
-                                                                          [0]])
-            elif dst in [Box3DMode.LIDAR, Box3DMode.DEPTH]:
-                yaw = torch.atan2(rot_yaw_vector[:, [1]], rot_yaw_vector[:,
-                                                                         [0]])
-            yaw = limit_period(yaw, period=np.pi * 2)
-
-        if with_yaw:
-            remains = arr[..., 7:]
-            arr = torch.cat([xyz[..., :3], xyz_size, yaw, remains], dim=-1)
-        else:
-            remains = arr[..., 6:]
-            arr = torch.cat([xyz[..., :3], xyz_size, remains], dim=-1)
+        _check_box_transform(src, dst)
+        rot_mat_T, translation = _split_rt_mat(src, dst, rt_mat, arr)
+        arr = _convert_tensor(arr, src, dst, rot_mat_T, translation, with_yaw,
+                              correct_yaw, return_yaw_vector)
 
         # convert arr to the original type
         original_type = type(box)
@@ -251,7 +158,7 @@ class Box3DMode(IntEnum):
             return original_type(arr.flatten().tolist())
         if is_numpy:
             return arr.numpy()
-        elif is_Instance3DBoxes:
+        elif is_Instance3DBoxes and not return_yaw_vector:
             if dst == Box3DMode.CAM:
                 target_type = CameraInstance3DBoxes
             elif dst == Box3DMode.LIDAR:
@@ -265,3 +172,294 @@ class Box3DMode(IntEnum):
             return target_type(arr, box_dim=arr.size(-1), with_yaw=with_yaw)
         else:
             return arr
+
+    @staticmethod
+    def get_converter(src: 'Box3DMode',
+                      dst: 'Box3DMode',
+                      rt_mat: Optional[Union[np.ndarray, Tensor]] = None,
+                      with_yaw: bool = True,
+                      correct_yaw: bool = False) -> Callable[[Tensor], Tensor]:
+        """Get a function converting Nxk tensor boxes from ``src`` mode to
+        ``dst`` mode.
+
+        The modes are checked once here, so the returned function skips the
+        dispatching of :meth:`convert` on input types in every call. A
+        non-Tensor ``rt_mat`` is converted once for each device and dtype of
+        the boxes.
+
+        Args:
+            src (:obj:`Box3DMode`): The source box mode.
+            dst (:obj:`Box3DMode`): The target box mode.
+            rt_mat (np.ndarray or Tensor, optional): The rotation and
+                translation matrix between different coordinates.
+                Defaults to None.
+            with_yaw (bool): Whether the boxes have a yaw angle.
+                Defaults to True.
+            correct_yaw (bool): If the yaw is rotated by rt_mat.
+                Defaults to False.
+
+        Returns:
+            Callable[[Tensor], Tensor]: The function converting the boxes.
+        """
+        if src == dst:
+            return lambda arr: arr
+        _check_box_transform(src, dst)
+        split_rt_mats = dict()
+
+        def converter(arr: Tensor) -> Tensor:
+            key = (arr.device, arr.dtype)
+            split_rt_mat = split_rt_mats.get(key)
+            if split_rt_mat is None:
+                split_rt_mat = _split_rt_mat(src, dst, rt_mat, arr)
+                split_rt_mats[key] = split_rt_mat
+            return _convert_tensor(arr, src, dst, *split_rt_mat, with_yaw,
+                                   correct_yaw)
+
+        return converter
+
+
+# rotation matrices between the coordinates of different box modes
+_DEFAULT_RT_MATS = {
+    (Box3DMode.LIDAR, Box3DMode.CAM): [[0, -1, 0], [0, 0, -1], [1, 0, 0]],
+    (Box3DMode.CAM, Box3DMode.LIDAR): [[0, 0, 1], [-1, 0, 0], [0, -1, 0]],
+    (Box3DMode.DEPTH, Box3DMode.CAM): [[1, 0, 0], [0, 0, -1], [0, 1, 0]],
+    (Box3DMode.CAM, Box3DMode.DEPTH): [[1, 0, 0], [0, 0, 1], [0, -1, 0]],
+    (Box3DMode.LIDAR, Box3DMode.DEPTH): [[0, -1, 0], [1, 0, 0], [0, 0, 1]],
+    (Box3DMode.DEPTH, Box3DMode.LIDAR): [[0, 1, 0], [-1, 0, 0], [0, 0, 1]],
+}
+# columns of the permuted sizes, and sign and offset of the yaw and whether
+# to limit it in [-pi, pi) without the yaw correction for each conversion
+_BOX_TRANSFORMS = {
+    (Box3DMode.LIDAR, Box3DMode.CAM): ([3, 5, 4], -1, -np.pi / 2, True),
+    (Box3DMode.CAM, Box3DMode.LIDAR): ([3, 5, 4], -1, -np.pi / 2, True),
+    (Box3DMode.DEPTH, Box3DMode.CAM): ([3, 5, 4], -1, 0, False),
+    (Box3DMode.CAM, Box3DMode.DEPTH): ([3, 5, 4], -1, 0, False),
+    (Box3DMode.LIDAR, Box3DMode.DEPTH): ([3, 4, 5], 1, np.pi / 2, True),
+    (Box3DMode.DEPTH, Box3DMode.LIDAR): ([3, 4, 5], 1, -np.pi / 2, True),
+}
+# column and sign of the sine of the yaw in the heading vector of the boxes
+_YAW_VECTOR_SIN_COLS = {
+    Box3DMode.LIDAR: (1, 1),
+    Box3DMode.DEPTH: (1, 1),
+    Box3DMode.CAM: (2, -1),
+}
+# the transposed default rotation matrices created on each device and dtype,
+# the least recently used ones are evicted beyond the maximum size
+_default_rot_mat_T_cache = OrderedDict()
+_DEFAULT_ROT_MAT_T_CACHE_SIZE = 32
+
+
+def _get_default_rot_mat_T(src: Box3DMode, dst: Box3DMode,
+                           arr: Tensor) -> Tensor:
+    """Get the transposed default rotation matrix from ``src`` to ``dst``
+    mode.
+
+    The matrices are created once for each device and dtype, which avoids
+    creating and copying them to the device in every conversion. At most
+    ``_DEFAULT_ROT_MAT_T_CACHE_SIZE`` matrices are cached.
+
+    Args:
+        src (:obj:`Box3DMode`): The source box mode.
+        dst (:obj:`Box3DMode`): The target box mode.
+        arr (Tensor): The boxes to be converted, which decide the device and
+            dtype of the matrix.
+
+    Returns:
+        Tensor: The transposed 3x3 rotation matrix, which should not be
+        modified inplace.
+    """
+    key = (src, dst, arr.device, arr.dtype)
+    rot_mat_T = _default_rot_mat_T_cache.get(key)
+    if rot_mat_T is not None:
+        _default_rot_mat_T_cache.move_to_end(key)
+        return rot_mat_T
+    rt_mat = arr.new_tensor(_DEFAULT_RT_MATS[(src, dst)])
+    rot_mat_T = rt_mat.t().contiguous()
+    _default_rot_mat_T_cache[key] = rot_mat_T
+    if len(_default_rot_mat_T_cache) > _DEFAULT_ROT_MAT_T_CACHE_SIZE:
+        _default_rot_mat_T_cache.popitem(last=False)
+    return rot_mat_T
+
+
+def _check_box_transform(src: Box3DMode, dst: Box3DMode) -> None:
+    """Check whether boxes can be converted from ``src`` to ``dst`` mode."""
+    if (src, dst) not in _BOX_TRANSFORMS:
+        raise NotImplementedError(f'Conversion from Box3DMode {src} to {dst} '
+                                  'is not supported yet')
+
+
+def _split_rt_mat(src: Box3DMode, dst: Box3DMode,
+                  rt_mat: Optional[Union[np.ndarray, Tensor]],
+                  arr: Tensor) -> Tuple[Tensor, Optional[Tensor]]:
+    """Split ``rt_mat`` into the transposed rotation and the translation.
+
+    Args:
+        src (:obj:`Box3DMode`): The source box mode.
+        dst (:obj:`Box3DMode`): The target box mode.
+        rt_mat (np.ndarray or Tensor, optional): The rotation and
+            translation matrix. The default rotation of the modes is used if
+            it is None.
+        arr (Tensor): The boxes to be converted, which decide the device and
+            dtype of a non-Tensor ``rt_mat``.
+
+    Returns:
+        tuple[Tensor]: The transposed 3x3 rotation matrix and the
+        translation, which is None for a 3x3 ``rt_mat``.
+    """
+    if rt_mat is None:
+        return _get_default_rot_mat_T(src, dst, arr), None
+    if not isinstance(rt_mat, Tensor):
+        rt_mat = arr.new_tensor(rt_mat)
+    translation = rt_mat[:3, 3] if rt_mat.size(1) == 4 else None
+    return rt_mat[:3, :3].t(), translation
+
+
+def _convert_tensor(arr: Tensor,
+                    src: Box3DMode,
+                    dst: Box3DMode,
+                    rot_mat_T: Tensor,
+                    translation: Optional[Tensor] = None,
+                    with_yaw: bool = True,
+                    correct_yaw: bool = False,
+                    return_yaw_vector: bool = False) -> Tensor:
+    """Convert Nxk tensor boxes between different modes, see
+    :meth:`Box3DMode.convert` for the other arguments.
+
+    Args:
+        rot_mat_T (Tensor): The transposed 3x3 rotation matrix.
+        translation (Tensor, optional): The translation. Defaults to None.
+
+    Returns:
+        Tensor: The converted boxes.
+    """
+    size_perm, yaw_sign, yaw_offset, limit_yaw = _BOX_TRANSFORMS[(src, dst)]
+    if with_yaw:
+        yaw = arr[..., 6:7]
+        if not correct_yaw:
+            yaw = yaw_sign * yaw + yaw_offset
+            if limit_yaw:
+                yaw = limit_period(yaw, period=np.pi * 2)
+    # the converted boxes are written to a single output tensor
+    if return_yaw_vector:
+        out = arr.new_empty(arr.size(0), arr.size(1) + 1)
+    else:
+        out = torch.empty_like(arr)
+    out[..., :3] = arr[..., :3] @ rot_mat_T
+    if translation is not None:
+        out[..., :3] += translation
+    out[..., 3:6] = arr[..., size_perm]
+
+    # Note: we only use rotation in rt_mat
+    # so don't need to extend yaw_vector
+    if with_yaw and correct_yaw:
+        # the heading vector lies in the x-y plane for LiDAR and Depth
+        # boxes and in the x-z plane for Camera boxes
+        sin_col, sin_sign = _YAW_VECTOR_SIN_COLS[src]
+        yaw_vector = arr.new_zeros(arr.size(0), 3)
+        yaw_vector[:, 0:1] = torch.cos(yaw)
+        yaw_vector[:, sin_col:sin_col + 1] = sin_sign * torch.sin(yaw)
+        rot_yaw_vector = yaw_vector @ rot_mat_T
+        if return_yaw_vector:
+            sin_col, sin_sign = _YAW_VECTOR_SIN_COLS[dst]
+            out[:, 6] = rot_yaw_vector[:, 0]
+            out[:, 7] = sin_sign * rot_yaw_vector[:, sin_col]
+        elif dst == Box3DMode.CAM:
+            yaw = torch.atan2(-rot_yaw_vector[:, [2]], rot_yaw_vector[:, [0]])
+            yaw = limit_period(yaw, period=np.pi * 2)
+        elif dst in [Box3DMode.LIDAR, Box3DMode.DEPTH]:
+            yaw = torch.atan2(rot_yaw_vector[:, [1]], rot_yaw_vector[:, [0]])
+            yaw = limit_period(yaw, period=np.pi * 2)
+
+    if return_yaw_vector:
+        out[..., 8:] = arr[..., 7:]
+    elif with_yaw:
+        out[..., 6:7] = yaw
+        out[..., 7:] = arr[..., 7:]
+    else:
+        out[..., 6:] = arr[..., 6:]
+    return out
+
+
+def _convert_numpy(arr: np.ndarray, src: Box3DMode, dst: Box3DMode,
+                   rt_mat: Optional[np.ndarray], with_yaw: bool) -> np.ndarray:
+    """Convert Nxk numpy boxes without the yaw correction.
+
+    Args:
+        arr (np.ndarray): The boxes to be converted.
+        src (:obj:`Box3DMode`): The source box mode.
+        dst (:obj:`Box3DMode`): The target box mode.
+        rt_mat (np.ndarray, optional): The rotation and translation matrix
+            between different coordinates.
+        with_yaw (bool): Whether the boxes have a yaw angle.
+
+    Returns:
+        np.ndarray: The converted boxes.
+    """
+    size_perm, yaw_sign, yaw_offset, limit_yaw = _BOX_TRANSFORMS[(src, dst)]
+    if rt_mat is None:
+        rt_mat = _DEFAULT_RT_MATS[(src, dst)]
+    rt_mat = np.asarray(rt_mat, dtype=arr.dtype)
+    if rt_mat.shape[1] == 4:
+        translation = np.ascontiguousarray(rt_mat[:3, 3])
+    else:
+        translation = np.zeros(3, dtype=arr.dtype)
+    return _convert_numpy_jit(
+        np.ascontiguousarray(arr), np.ascontiguousarray(rt_mat[:3, :3].T),
+        translation, np.array(size_perm), with_yaw, float(yaw_sign),
+        float(yaw_offset), limit_yaw)
+
+
+@numba.njit
+def _convert_numpy_jit(arr, rot_mat_T, translation, size_perm, with_yaw,
+                       yaw_sign, yaw_offset, limit_yaw):
+    """Convert Nxk numpy boxes, see :func:`_convert_numpy`."""
+    out = np.empty_like(arr)
+    for i in range(arr.shape[0]):
+        for j in range(3):
+            out[i, j] = (
+                arr[i, 0] * rot_mat_T[0, j] + arr[i, 1] * rot_mat_T[1, j] +
+                arr[i, 2] * rot_mat_T[2, j] + translation[j])
+            out[i, 3 + j] = arr[i, size_perm[j]]
+        start = 6
+        if with_yaw:
+            yaw = yaw_sign * arr[i, 6] + yaw_offset
+            if limit_yaw:
+                # same as `limit_period` with offset 0.5 and period 2 * pi
+                yaw -= np.floor(yaw / (2 * np.pi) + 0.5) * 2 * np.pi
+            out[i, 6] = yaw
+            start = 7
+        for j in range(start, arr.shape[1]):
+            out[i, j] = arr[i, j]
+    return out
+
+
+def _convert_single_box(box: Sequence[float], src: Box3DMode, dst: Box3DMode,
+                        with_yaw: bool) -> List[float]:
+    """Convert a single box with the default rotation in pure Python.
+
+    Args:
+        box (Sequence[float]): A k-tuple or k-list box.
+        src (:obj:`Box3DMode`): The source box mode.
+        dst (:obj:`Box3DMode`): The target box mode.
+        with_yaw (bool): Whether the box has a yaw angle.
+
+    Returns:
+        list[float]: The converted box.
+    """
+    size_perm, yaw_sign, yaw_offset, limit_yaw = _BOX_TRANSFORMS[(src, dst)]
+    xyz = box[:3]
+    out = [
+        sum(r * v for r, v in zip(row, xyz))
+        for row in _DEFAULT_RT_MATS[(src, dst)]
+    ]
+    out.extend(box[i] for i in size_perm)
+    if with_yaw:
+        yaw = yaw_sign * box[6] + yaw_offset
+        if limit_yaw:
+            # same as `limit_period` with offset 0.5 and period 2 * pi
+            yaw -= math.floor(yaw / (2 * np.pi) + 0.5) * 2 * np.pi
+        out.append(yaw)
+        out.extend(box[7:])
+    else:
+        out.extend(box[6:])
+    return out
@@ -1,6 +1,7 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 
 import numpy as np
+import pytest
 import torch
 from mmcv.transforms.base import BaseTransform
 from mmengine.registry import TRANSFORMS
@@ -106,3 +107,9 @@ def test_getitem():
     # all instance have been filtered by classes
     assert len(ann_info['gt_labels_3d']) == 0
     assert len(car_kitti_dataset.metainfo['classes']) == 1
+
+    # labels out of the original classes are not mapped silently
+    input_dict['instances'][0]['bbox_label_3d'] = len(
+        KittiDataset.METAINFO['classes'])
+    with pytest.raises(AssertionError):
+        car_kitti_dataset.parse_ann_info(input_dict)
@@ -49,6 +49,19 @@ class TestLoadPointsFromFile(unittest.TestCase):
         self.assertIn('use_color=False', repr_str)
         self.assertIn('load_dim=4', repr_str)
 
+        # test loading with memory map
+        load_points_transform = LoadPointsFromFile(
+            coord_type='LIDAR',
+            load_dim=4,
+            use_dim=use_dim,
+            backend_args=backend_args,
+            use_mmap=True)
+        mmap_info = load_points_transform(create_dummy_data_info())
+        info = LoadPointsFromFile(
+            coord_type='LIDAR', load_dim=4, use_dim=use_dim)(
+                create_dummy_data_info())
+        assert_allclose(mmap_info['points'].tensor, info['points'].tensor)
+
 
 class TestLoadAnnotations3D(unittest.TestCase):
 
@@ -1,13 +1,19 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import copy
+import os
+import os.path as osp
+import shutil
 
 import numpy as np
 import torch
 from mmcv.transforms.base import BaseTransform
+from mmengine.fileio import load
 from mmengine.registry import TRANSFORMS
 from mmengine.structures import InstanceData
 
 from mmdet3d.datasets import WaymoDataset
-from mmdet3d.structures import Det3DDataSample, LiDARInstance3DBoxes
+from mmdet3d.structures import (CameraInstance3DBoxes, Det3DDataSample,
+                                LiDARInstance3DBoxes)
 
 
 def _generate_waymo_dataset_config():
@@ -78,3 +84,151 @@ def test_getitem():
     assert ann_info['centers_2d'].dtype == np.float32
     assert 'depths' in ann_info
     assert ann_info['depths'].dtype == np.float32
+
+
+def test_cache_data_list(tmp_path):
+    data_root, ann_file, classes, data_prefix, \
+        pipeline, modality, = _generate_waymo_dataset_config()
+    cached_ann_file = str(tmp_path / ann_file)
+    shutil.copy(osp.join(data_root, ann_file), cached_ann_file)
+
+    def build_dataset(**kwargs):
+        return WaymoDataset(
+            data_root,
+            cached_ann_file,
+            data_prefix=data_prefix,
+            pipeline=pipeline,
+            metainfo=dict(classes=classes),
+            modality=modality,
+            cache_data_list=True,
+            **kwargs)
+
+    waymo_dataset = build_dataset()
+    assert len(list(tmp_path.glob(f'{ann_file}.parsed.*.pkl'))) == 1
+    cached_dataset = build_dataset()
+    assert len(cached_dataset) == len(waymo_dataset)
+    assert cached_dataset.num_ins_per_cat == waymo_dataset.num_ins_per_cat
+    input_dict = waymo_dataset.get_data_info(0)
+    cached_input_dict = cached_dataset.get_data_info(0)
+    assert cached_input_dict['lidar_path'] == input_dict['lidar_path']
+    assert torch.allclose(cached_input_dict['ann_info']['gt_bboxes_3d'].tensor,
+                          input_dict['ann_info']['gt_bboxes_3d'].tensor)
+
+    # the camera matrices are cached in a side-car file per key
+    waymo_dataset = build_dataset(load_type='mv_image_based')
+    npy_files = list(tmp_path.glob(f'{ann_file}.parsed.*.npy'))
+    assert len(npy_files) == len(waymo_dataset.cam_matrices) == 3
+    cached_dataset = build_dataset(load_type='mv_image_based')
+    input_dict = waymo_dataset.get_data_info(0)
+    cached_input_dict = cached_dataset.get_data_info(0)
+    for key in ('lidar2cam', 'cam2img', 'lidar2img'):
+        assert np.allclose(cached_input_dict[key], input_dict[key])
+    # the matrices of the keys have different shapes
+    assert cached_input_dict['cam2img'].shape == (3, 4)
+    assert cached_input_dict['lidar2cam'].shape == (4, 4)
+
+    # the data list is parsed again if a side-car file is missing
+    os.remove(npy_files[0])
+    cached_dataset = build_dataset(load_type='mv_image_based')
+    cached_input_dict = cached_dataset.get_data_info(0)
+    for key in ('lidar2cam', 'cam2img', 'lidar2img'):
+        assert np.allclose(cached_input_dict[key], input_dict[key])
+    assert len(list(tmp_path.glob(f'{ann_file}.parsed.*.npy'))) == 3
+
+
+def test_mv_image_based():
+    data_root, ann_file, classes, data_prefix, \
+        pipeline, modality, = _generate_waymo_dataset_config()
+    waymo_dataset = WaymoDataset(
+        data_root,
+        ann_file,
+        data_prefix=data_prefix,
+        pipeline=pipeline,
+        metainfo=dict(classes=classes),
+        modality=dict(use_lidar=False, use_camera=True),
+        box_type_3d='Camera',
+        load_type='mv_image_based')
+
+    raw_info = load(osp.join(data_root, ann_file))['data_list'][0]
+    raw_img_info = raw_info['images']['CAM_FRONT']
+    input_dict = waymo_dataset.get_data_info(0)
+    img_info = input_dict['images']['CAM_FRONT']
+    assert 'cam_matrix_idx' not in img_info
+    for key in ('lidar2cam', 'cam2img', 'lidar2img'):
+        assert np.allclose(input_dict[key], np.array(raw_img_info[key]))
+        assert np.allclose(img_info[key], np.array(raw_img_info[key]))
+    # the top-level matrices do not share memory with the image infos
+    input_dict['cam2img'][0, 0] += 1
+    assert np.allclose(img_info['cam2img'], np.array(raw_img_info['cam2img']))
+    # boxes are kept as arrays in the data list and built on fetching
+    assert isinstance(input_dict['ann_info']['gt_bboxes_3d'],
+                      CameraInstance3DBoxes)
+    waymo_dataset[0]
+
+    front_dataset = WaymoDataset(
+        data_root,
+        ann_file,
+        data_prefix=data_prefix,
+        pipeline=pipeline,
+        metainfo=dict(classes=classes),
+        modality=dict(use_lidar=False, use_camera=True),
+        box_type_3d='Camera',
+        load_type='mv_image_based',
+        use_cams=['CAM_FRONT'])
+    assert len(front_dataset) == 1
+    for i in range(len(front_dataset)):
+        assert list(front_dataset.get_data_info(i)['images']) == ['CAM_FRONT']
+
+
+def test_parallel_parse_data_list(monkeypatch):
+    data_root, ann_file, classes, data_prefix, \
+        pipeline, modality, = _generate_waymo_dataset_config()
+    annotations = load(osp.join(data_root, ann_file))
+    raw_info = annotations['data_list'][0]
+    data_list = []
+    for i in range(6):
+        info = copy.deepcopy(raw_info)
+        info['sample_idx'] = i
+        data_list.append(info)
+
+    def load_annotations(*args, **kwargs):
+        return dict(
+            metainfo=annotations['metainfo'],
+            data_list=copy.deepcopy(data_list))
+
+    monkeypatch.setattr('mmdet3d.datasets.waymo_dataset.load',
+                        load_annotations)
+
+    def build_dataset():
+        return WaymoDataset(
+            data_root,
+            ann_file,
+            data_prefix=data_prefix,
+            pipeline=pipeline,
+            metainfo=dict(classes=classes),
+            modality=dict(use_lidar=False, use_camera=True),
+            box_type_3d='Camera',
+            load_type='mv_image_based')
+
+    serial_dataset = build_dataset()
+    monkeypatch.setenv('MMDET3D_PARALLEL_PARSE', '2')
+    parallel_dataset = build_dataset()
+    assert len(parallel_dataset) == len(serial_dataset) == 6
+    assert parallel_dataset.num_ins_per_cat == serial_dataset.num_ins_per_cat
+    for i in range(len(serial_dataset)):
+        input_dict = serial_dataset.get_data_info(i)
+        parallel_input_dict = parallel_dataset.get_data_info(i)
+        # one image per frame, in the order of the raw data infos
+        assert parallel_input_dict['sample_idx'] == input_dict[
+            'sample_idx'] == i
+        assert [
+            img_info['img_path']
+            for img_info in parallel_input_dict['images'].values()
+        ] == [
+            img_info['img_path'] for img_info in input_dict['images'].values()
+        ]
+        assert np.array_equal(parallel_input_dict['ann_info']['gt_labels_3d'],
+                              input_dict['ann_info']['gt_labels_3d'])
+        assert torch.equal(
+            parallel_input_dict['ann_info']['gt_bboxes_3d'].tensor,
+            input_dict['ann_info']['gt_bboxes_3d'].tensor)
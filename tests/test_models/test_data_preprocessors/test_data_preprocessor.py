@@ -3,9 +3,11 @@ from unittest import TestCase
 
 import pytest
 import torch
+from mmengine.structures import InstanceData
 
-from mmdet3d.models.data_preprocessors import Det3DDataPreprocessor
-from mmdet3d.structures import Det3DDataSample, PointData
+from mmdet3d.models.data_preprocessors import (BatchGlobalRotScaleFlip3D,
+                                               Det3DDataPreprocessor)
+from mmdet3d.structures import Det3DDataSample, LiDARInstance3DBoxes, PointData
 
 
 class TestDet3DDataPreprocessor(TestCase):
@@ -126,3 +128,60 @@ class TestDet3DDataPreprocessor(TestCase):
             'data_samples']
         self.assertEqual(batch_inputs['voxels']['voxels'].shape, (10000, 6))
         self.assertEqual(batch_inputs['voxels']['coors'].shape, (10000, 4))
+
+
+class TestBatchGlobalRotScaleFlip3D(TestCase):
+
+    def test_forward(self):
+        points = torch.rand((100, 4)) * 20 - 10
+        bboxes_3d = LiDARInstance3DBoxes(
+            torch.tensor([[1., 2., -1., 2., 1., 1.5, 0.3],
+                          [50., 0., -1., 2., 1., 1.5, 0.3]]))
+        data_sample = Det3DDataSample()
+        data_sample.gt_instances_3d = InstanceData(
+            bboxes_3d=bboxes_3d, labels_3d=torch.tensor([0, 1]))
+
+        # pure flipping
+        batch_aug = BatchGlobalRotScaleFlip3D(
+            flip_ratio_bev_horizontal=1.0,
+            rot_range=[0, 0],
+            scale_ratio_range=[1, 1],
+            shuffle_points=False)
+        out_points, out_data_samples = batch_aug([points], [data_sample])
+        self.assertTrue(torch.allclose(out_points[0][:, 1], -points[:, 1]))
+        self.assertTrue(torch.allclose(out_points[0][:, 3], points[:, 3]))
+        expected_bboxes_3d = bboxes_3d.clone()
+        expected_bboxes_3d.flip('horizontal')
+        self.assertTrue(
+            torch.allclose(
+                out_data_samples[0].gt_instances_3d.bboxes_3d.tensor,
+                expected_bboxes_3d.tensor))
+
+        # rotation is consistent with `LiDARInstance3DBoxes.rotate`
+        data_sample.gt_instances_3d.bboxes_3d = bboxes_3d.clone()
+        batch_aug = BatchGlobalRotScaleFlip3D(
+            rot_range=[0.5, 0.5],
+            scale_ratio_range=[1, 1],
+            shuffle_points=False)
+        out_points, out_data_samples = batch_aug([points], [data_sample])
+        expected_bboxes_3d = bboxes_3d.clone()
+        expected_points, _ = expected_bboxes_3d.rotate(0.5, points.clone())
+        self.assertTrue(
+            torch.allclose(
+                out_data_samples[0].gt_instances_3d.bboxes_3d.tensor,
+                expected_bboxes_3d.tensor,
+                atol=1e-5))
+        self.assertTrue(
+            torch.allclose(out_points[0], expected_points, atol=1e-5))
+
+        # range filtering
+        data_sample.gt_instances_3d.bboxes_3d = bboxes_3d.clone()
+        batch_aug = BatchGlobalRotScaleFlip3D(
+            rot_range=[0, 0],
+            scale_ratio_range=[1, 1],
+            point_cloud_range=[-5, -5, -5, 5, 5, 5])
+        out_points, out_data_samples = batch_aug([points], [data_sample])
+        self.assertTrue((out_points[0][:, :3].abs() < 5).all())
+        gt_instances_3d = out_data_samples[0].gt_instances_3d
+        self.assertEqual(len(gt_instances_3d), 1)
+        self.assertEqual(gt_instances_3d.labels_3d.tolist(), [0])
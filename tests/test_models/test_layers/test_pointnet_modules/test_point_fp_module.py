@@ -1,7 +1,11 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import copy
+
 import numpy as np
 import pytest
 import torch
+from mmengine.utils import digit_version
+from mmengine.utils.dl_utils import TORCH_VERSION
 
 
 def test_pointnet_fp_module():
@@ -28,3 +32,157 @@ def test_pointnet_fp_module():
 
     fp_features = self(xyz1, xyz2, features1, features2)
     assert fp_features.shape == torch.Size([1, 16, 50])
+
+    # the pure PyTorch neighbor search matches the `three_nn` kernel
+    self.eval()
+    with torch.no_grad():
+        torch_fp_features = self(xyz1, xyz2, features1, features2)
+        self.torch_nn_max_pairs = 0
+        kernel_fp_features = self(xyz1, xyz2, features1, features2)
+    assert torch.allclose(torch_fp_features, kernel_fp_features, atol=1e-5)
+
+    # Conv2d weights of old checkpoints are loaded into the Conv1d mlps
+    state_dict = self.state_dict()
+    old_weight = state_dict['mlps.layer0.conv.weight'].unsqueeze(-1)
+    state_dict['mlps.layer0.conv.weight'] = old_weight
+    self.load_state_dict(state_dict)
+    assert torch.equal(self.mlps.layer0.conv.weight, old_weight.squeeze(-1))
+
+
+def test_pointnet_fp_module_norm_cfg():
+    from mmdet3d.models.layers import PointFPModule
+
+    # 2D norm types are mapped to their 1D types for the Conv1d mlps
+    self = PointFPModule(mlp_channels=[24, 16], norm_cfg=dict(type='BN'))
+    assert isinstance(self.mlps.layer0.bn, torch.nn.BatchNorm1d)
+    features = torch.rand(2, 24, 10)
+    assert self.mlps(features).shape == torch.Size([2, 16, 10])
+    self = PointFPModule(mlp_channels=[24, 16], norm_cfg=dict(type='IN2d'))
+    assert isinstance(self.mlps.layer0.norm, torch.nn.InstanceNorm1d)
+
+    with pytest.raises(ValueError):
+        PointFPModule(mlp_channels=[24, 16], norm_cfg=dict(type='LN'))
+
+
+def test_pointnet_fp_module_torch_nn():
+    from mmdet3d.models.layers import PointFPModule
+
+    self = PointFPModule(mlp_channels=[24, 16])
+    xyz = np.fromfile('tests/data/sunrgbd/points/000001.bin',
+                      np.float32).reshape((1, -1, 6))[..., :3]
+    target, source = xyz[:, 0::2], xyz[:, 1::3]
+    idx, weight = self._three_nn_weighted(
+        torch.from_numpy(target), torch.from_numpy(source), True)
+
+    # brute-force three nearest neighbors with exact distances
+    dist = np.linalg.norm(
+        target[0, :, None].astype(np.float64) - source[0, None], axis=-1)
+    expected_idx = np.argsort(dist, axis=1)[:, :3]
+    expected_weight = 1.0 / (
+        np.take_along_axis(dist, expected_idx, axis=1) + 1e-8)
+    expected_weight /= expected_weight.sum(axis=1, keepdims=True)
+    order = idx[0].argsort(dim=1)
+    assert np.array_equal(
+        np.sort(expected_idx, axis=1), idx[0].gather(1, order).numpy())
+    assert np.allclose(
+        np.take_along_axis(expected_weight, np.argsort(expected_idx, 1), 1),
+        weight[0].gather(1, order).numpy(),
+        atol=1e-4)
+
+
+def test_pointnet_fp_module_amp():
+    from mmdet3d.models.layers import PointFPModule
+
+    self = PointFPModule(mlp_channels=[24, 16])
+    xyz = torch.from_numpy(
+        np.fromfile('tests/data/sunrgbd/points/000001.bin',
+                    np.float32).reshape((1, -1, 6))[..., :3])
+    idx, weight = self._three_nn_weighted(xyz[:, 0::2], xyz[:, 1::3], True)
+
+    self.enable_amp = True
+    amp_idx, amp_weight = self._three_nn_weighted(xyz[:, 0::2], xyz[:, 1::3],
+                                                  True)
+    assert amp_weight.dtype == torch.bfloat16
+    assert torch.equal(idx, amp_idx)
+    # bfloat16 keeps 8 bits of mantissa
+    assert torch.allclose(weight, amp_weight.float(), atol=1e-2)
+
+
+def test_pointnet_fp_module_keops():
+    if not torch.cuda.is_available():
+        pytest.skip()
+    pytest.importorskip('pykeops')
+    from mmdet3d.models.layers import PointFPModule
+
+    self = PointFPModule(
+        mlp_channels=[24, 16], torch_nn_max_pairs=0, keops_min_pairs=1).cuda()
+    xyz = torch.from_numpy(
+        np.fromfile('tests/data/sunrgbd/points/000001.bin',
+                    np.float32).reshape((1, -1, 6))[..., :3]).cuda()
+    idx, weight = self._three_nn_weighted(xyz[:, 0::2], xyz[:, 1::3], False)
+
+    self.keops_min_pairs = float('inf')
+    kernel_idx, kernel_weight = self._three_nn_weighted(
+        xyz[:, 0::2], xyz[:, 1::3], False)
+    assert idx.dtype == kernel_idx.dtype
+    assert torch.allclose(
+        weight.sort(-1)[0], kernel_weight.sort(-1)[0], atol=1e-4)
+
+
+def test_pointnet_fp_module_cuda_graph():
+    from mmdet3d.models.layers import PointFPModule
+    with pytest.raises(AssertionError):
+        PointFPModule(
+            mlp_channels=[24, 16], compile_mlps=True, use_cuda_graph=True)
+    if not torch.cuda.is_available():
+        pytest.skip()
+
+    self = PointFPModule(mlp_channels=[24, 16]).cuda().eval()
+    xyz = torch.from_numpy(
+        np.fromfile('tests/data/sunrgbd/points/000001.bin',
+                    np.float32).reshape((1, -1, 6))[..., :3]).cuda()
+    xyz1, xyz2 = xyz[:, 0::2].contiguous(), xyz[:, 1::3].contiguous()
+    features1 = xyz1.repeat([1, 1, 4]).transpose(1, 2).contiguous()
+    features2 = xyz2.repeat([1, 1, 4]).transpose(1, 2).contiguous()
+
+    with torch.no_grad():
+        fp_features = self(xyz1, xyz2, features1, features2)
+        self.use_cuda_graph = True
+        for _ in range(2):
+            graph_fp_features = self(xyz1, xyz2, features1, features2)
+            assert torch.allclose(graph_fp_features, fp_features, atol=1e-5)
+        assert len(self._cuda_graphs) == 1
+        # new shapes run eagerly once the graph cache is full
+        self.max_cuda_graphs = 1
+        fp_features = self(xyz1[:, :10], xyz2, features1[..., :10], features2)
+        assert fp_features.shape == torch.Size([1, 16, 10])
+    assert len(self._cuda_graphs) == 1
+
+
+def test_pointnet_fp_module_compile_mlps():
+    if digit_version(TORCH_VERSION) < digit_version('2.1.0'):
+        pytest.skip('torch.compile requires PyTorch>=2.1')
+    from mmdet3d.models.layers import PointFPModule
+
+    self = PointFPModule(mlp_channels=[24, 16], compile_mlps=True).eval()
+    xyz = torch.from_numpy(
+        np.fromfile('tests/data/sunrgbd/points/000001.bin',
+                    np.float32).reshape((1, -1, 6))[..., :3])
+    xyz1, xyz2 = xyz[:, 0::2].contiguous(), xyz[:, 1::3].contiguous()
+    features1 = xyz1.repeat([1, 1, 4]).transpose(1, 2).contiguous()
+    features2 = xyz2.repeat([1, 1, 4]).transpose(1, 2).contiguous()
+
+    def forward(module, compile_mlps):
+        module.compile_mlps = compile_mlps
+        return module(xyz1, xyz2, features1, features2)
+
+    with torch.no_grad():
+        assert torch.allclose(
+            forward(self, True), forward(self, False), atol=1e-5)
+        # the compiled forward runs the weights of a deep copy
+        copied = copy.deepcopy(self)
+        copied.mlps.layer0.conv.weight.add_(1)
+        assert torch.allclose(
+            forward(copied, True), forward(copied, False), atol=1e-5)
+        assert not torch.allclose(
+            forward(copied, True), forward(self, True), atol=1e-5)
@@ -199,6 +199,21 @@ def test_aligned_anchor_generator():
         # anchors on 8 location
         assert single_level_anchor[:56:7].allclose(expected_grid_anchors[i])
 
+    # anchors of the same feature map sizes are reused
+    cached_anchors = anchor_generator.grid_anchors(
+        featmap_sizes, device=device)
+    for anchors, cached in zip(multi_level_anchors, cached_anchors):
+        assert cached is anchors
+    # only the anchors of the last feature map sizes are kept
+    other_featmap_sizes = [(h * 2, w * 2) for h, w in featmap_sizes]
+    anchor_generator.grid_anchors(other_featmap_sizes, device=device)
+    assert anchor_generator.cached_anchors[0][0] == tuple(other_featmap_sizes)
+    cached_anchors = anchor_generator.grid_anchors(
+        featmap_sizes, device=device)
+    for anchors, cached in zip(multi_level_anchors, cached_anchors):
+        assert cached is not anchors
+        assert torch.equal(cached, anchors)
+
 
 def test_aligned_anchor_generator_per_cls():
 
@@ -1,5 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import unittest
+from collections import OrderedDict
 
 import numpy as np
 import pytest
@@ -679,6 +680,76 @@ def test_boxes_conversion():
         rt_mat.inverse().numpy())
     assert np.allclose(np.array(cam_to_lidar_box), expected_tensor[0].numpy())
 
+    # test list convert with the default rotation
+    for src, dst in [(Box3DMode.CAM, Box3DMode.LIDAR),
+                     (Box3DMode.LIDAR, Box3DMode.CAM),
+                     (Box3DMode.DEPTH, Box3DMode.CAM),
+                     (Box3DMode.CAM, Box3DMode.DEPTH),
+                     (Box3DMode.LIDAR, Box3DMode.DEPTH),
+                     (Box3DMode.DEPTH, Box3DMode.LIDAR)]:
+        box = camera_boxes.tensor[0].numpy().tolist()
+        converted_box = Box3DMode.convert(tuple(box), src, dst)
+        assert isinstance(converted_box, tuple)
+        expected_box = Box3DMode.convert(camera_boxes.tensor[:1], src, dst)
+        assert np.allclose(
+            np.array(converted_box), expected_box[0].numpy(), atol=1e-5)
+
+    # test returning the cosine and sine of the corrected yaw
+    for src, dst in [(Box3DMode.CAM, Box3DMode.LIDAR),
+                     (Box3DMode.LIDAR, Box3DMode.CAM),
+                     (Box3DMode.LIDAR, Box3DMode.DEPTH)]:
+        expected_box = Box3DMode.convert(
+            camera_boxes.tensor, src, dst, correct_yaw=True)
+        converted_box = Box3DMode.convert(
+            camera_boxes.tensor,
+            src,
+            dst,
+            correct_yaw=True,
+            return_yaw_vector=True)
+        assert converted_box.shape[1] == camera_boxes.tensor.shape[1] + 1
+        assert torch.allclose(converted_box[:, :6], expected_box[:, :6])
+        assert torch.allclose(
+            converted_box[:, 6], torch.cos(expected_box[:, 6]), atol=1e-5)
+        assert torch.allclose(
+            converted_box[:, 7], torch.sin(expected_box[:, 6]), atol=1e-5)
+
+    # test the converter specialized for the modes
+    converter = Box3DMode.get_converter(Box3DMode.CAM, Box3DMode.LIDAR,
+                                        rt_mat.inverse())
+    expected_box = Box3DMode.convert(camera_boxes.tensor, Box3DMode.CAM,
+                                     Box3DMode.LIDAR, rt_mat.inverse())
+    assert torch.allclose(converter(camera_boxes.tensor), expected_box)
+    converter = Box3DMode.get_converter(Box3DMode.CAM, Box3DMode.LIDAR,
+                                        rt_mat.inverse().numpy())
+    for _ in range(2):
+        assert torch.allclose(
+            converter(camera_boxes.tensor), expected_box, atol=1e-5)
+    converter = Box3DMode.get_converter(Box3DMode.CAM, Box3DMode.CAM)
+    assert converter(camera_boxes.tensor) is camera_boxes.tensor
+    with pytest.raises(NotImplementedError):
+        Box3DMode.get_converter(Box3DMode.DEPTH, 3)
+
+    # test numpy convert matches tensor convert
+    for src, dst in [(Box3DMode.CAM, Box3DMode.LIDAR),
+                     (Box3DMode.LIDAR, Box3DMode.CAM),
+                     (Box3DMode.DEPTH, Box3DMode.CAM),
+                     (Box3DMode.CAM, Box3DMode.DEPTH),
+                     (Box3DMode.LIDAR, Box3DMode.DEPTH),
+                     (Box3DMode.DEPTH, Box3DMode.LIDAR)]:
+        converted_box = Box3DMode.convert(camera_boxes.tensor.numpy(), src,
+                                          dst)
+        expected_box = Box3DMode.convert(camera_boxes.tensor, src, dst)
+        assert isinstance(converted_box, np.ndarray)
+        assert np.allclose(converted_box, expected_box.numpy(), atol=1e-5)
+
+    # test numpy boxes without the yaw column
+    converted_box = Box3DMode.convert(camera_boxes.tensor[:, :6].numpy(),
+                                      Box3DMode.CAM, Box3DMode.LIDAR)
+    expected_box = Box3DMode.convert(camera_boxes.tensor[:, :6], Box3DMode.CAM,
+                                     Box3DMode.LIDAR)
+    assert converted_box.shape == (camera_boxes.tensor.size(0), 6)
+    assert np.allclose(converted_box, expected_box.numpy(), atol=1e-5)
+
     # test convert from depth to lidar
     depth_boxes = torch.tensor(
         [[2.4593, 2.5870, -0.4321, 0.8597, 0.6193, 1.0204, 3.0693],
@@ -709,6 +780,23 @@ def test_boxes_conversion():
         Box3DMode.convert(depth_boxes, Box3DMode.DEPTH, 3)
 
 
+def test_default_rot_mat_T_cache(monkeypatch):
+    from mmdet3d.structures.bbox_3d import box_3d_mode
+
+    # the least recently used default rotation matrices are evicted
+    monkeypatch.setattr(box_3d_mode, '_DEFAULT_ROT_MAT_T_CACHE_SIZE', 2)
+    monkeypatch.setattr(box_3d_mode, '_default_rot_mat_T_cache', OrderedDict())
+    boxes = torch.rand(4, 7)
+    for src, dst in [(Box3DMode.CAM, Box3DMode.LIDAR),
+                     (Box3DMode.LIDAR, Box3DMode.CAM),
+                     (Box3DMode.LIDAR, Box3DMode.DEPTH)]:
+        Box3DMode.convert(boxes, src, dst)
+    assert list(box_3d_mode._default_rot_mat_T_cache) == [
+        (Box3DMode.LIDAR, Box3DMode.CAM, boxes.device, boxes.dtype),
+        (Box3DMode.LIDAR, Box3DMode.DEPTH, boxes.device, boxes.dtype)
+    ]
+
+
 def test_camera_boxes3d():
     # Test init with numpy array
     np_boxes = np.array([[